@@ -1,5 +1,8 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
 from app.core.config import settings
+from app.dependencies import model_status
+from app.utils.mistral_client import generation_stats
 
 router = APIRouter()
 
@@ -13,6 +16,12 @@ def health_check():
         "api_version": "v1"
     }
 
+@router.get("/ready")
+def readiness_check():
+    """Report each model's load state; 503 until every enabled model is loaded"""
+    status = model_status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
+
 @router.get("/info")
 def get_info():
     """Get system configuration info"""
@@ -23,5 +32,6 @@ def get_info():
         "max_file_size_mb": settings.MAX_FILE_SIZE // (1024 * 1024),
         "embedding_model": settings.EMBEDDING_MODEL,
         "mistral_url": settings.MISTRAL_BASE_URL,
-        "pinecone_index": settings.PINECONE_INDEX_NAME
+        "pinecone_index": settings.PINECONE_INDEX_NAME,
+        "generation": generation_stats.stats()
     }
@@ -1,4 +1,5 @@
 from fastapi import APIRouter, Depends
+from fastapi.responses import StreamingResponse
 from app.models.schemas import QueryRequest, QueryResponse
 from app.services.query_service import QueryService
 from app.dependencies import get_query_service
@@ -6,9 +7,22 @@ from app.dependencies import get_query_service
 router = APIRouter()
 
 @router.post("/", response_model=QueryResponse)
-def query_documents(
+async def query_documents(
     req: QueryRequest,
     query_service: QueryService = Depends(get_query_service)
 ):
     """Query documents using RAG."""
-    return query_service.process_query(req)
+    return await query_service.process_query(req)
+
+
+@router.post("/stream")
+async def stream_query_documents(
+    req: QueryRequest,
+    query_service: QueryService = Depends(get_query_service)
+):
+    """Query documents using RAG, streaming references and answer tokens as Server-Sent Events."""
+    return StreamingResponse(
+        await query_service.stream_query(req),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -1,6 +1,6 @@
 # app/api/v1/endpoints/upload.py
 from fastapi import APIRouter, HTTPException, File, UploadFile, Depends
-from app.models.schemas import UploadResponse
+from app.models.schemas import UploadResponse, JobStatusResponse
 from app.services.document_service import DocumentService
 from app.dependencies import get_document_service
 
@@ -11,7 +11,7 @@ async def upload_file(
     file: UploadFile = File(...),
     doc_service: DocumentService = Depends(get_document_service)
 ):
-    """Upload and process a document file."""
+    """Upload a document file and queue it for processing."""
     if not file.filename:
         raise HTTPException(status_code=400, detail="No file provided")
     
@@ -29,10 +29,20 @@ async def upload_file(
         result = await doc_service.process_upload(file)
         return UploadResponse(
             message=result["message"],
-            filename=result["filename"]
+            filename=result["filename"],
+            job_id=result["job_id"],
+            status=result["status"]
         )
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
 
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_upload_job(
+    job_id: str,
+    doc_service: DocumentService = Depends(get_document_service)
+):
+    """Get the processing status of an uploaded document."""
+    return await doc_service.get_job_status(job_id)
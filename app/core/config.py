@@ -8,6 +8,13 @@ class Settings(BaseSettings):
     # API Settings
     API_V1_STR: str = "/api/v1"
     PROJECT_NAME: str = "Document RAG API"
+    VERSION: str = "1.0.0"
+    MODEL_WARMUP: bool = True  # load models in a background task at startup rather than on first request
+    API_WORKERS: int = 1  # uvicorn workers; above 1, backend_run.py starts shared model-server processes
+    MODEL_SERVER_DIR: str = ""  # sockets of running model servers; empty loads models in-process
+    MODEL_SERVER_AUTHKEY: str = ""  # generated by backend_run.py when empty
+    MODEL_SERVER_MODELS: str = "embedding,ocr,rerank"  # models served out of process (rerank only when enabled)
+    # The local index, BM25 index and embedding cache are always served out of process when model servers run
     API_URL: str = ""  # Add this field
     
     # File Upload Settings
@@ -22,12 +29,63 @@ class Settings(BaseSettings):
     PINECONE_API_KEY: str = ""
     PINECONE_INDEX_NAME: str = "rag"
     
+    # Vector Store Settings
+    VECTOR_STORE: str = "pinecone"  # "pinecone" or "local" (embedded index, no network)
+    LOCAL_INDEX_DIR: str = "./vector_index"
+    LOCAL_INDEX_NPROBE: int = 8  # IVF lists scanned per query
+    LOCAL_INDEX_IVF_THRESHOLD: int = 20000  # below this many vectors queries are exact
+    LOCAL_INDEX_QUANTIZATION: str = "none"  # "int8" (4x smaller) or "binary" (32x) codes scanned before float rescoring
+    LOCAL_INDEX_RESCORE_FACTOR: int = 40  # candidates per requested result rescored with float vectors (binary needs ~40)
+    
+    # Hybrid Search Settings
+    HYBRID_SEARCH_ENABLED: bool = True  # fuse BM25 keyword results with dense results
+    LEXICAL_INDEX_PATH: str = "./vector_index/lexical.sqlite3"
+    HYBRID_CANDIDATES: int = 20  # results taken from each retriever before fusion
+    RRF_K: int = 60  # reciprocal-rank fusion constant
+    
+    # Rerank Settings
+    RERANK_ENABLED: bool = False
+    RERANK_MODEL: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    RERANK_CANDIDATES: int = 20  # chunks retrieved and rescored before keeping top_k
+    RERANK_BATCH_SIZE: int = 32
+    RERANK_CACHE_SIZE: int = 10000  # cached (query, chunk) scores
+    
+    # Query Settings
+    QUERY_ENCODE_WORKERS: int = 2  # threads for query embedding and reranking
+    QUERY_SEARCH_WORKERS: int = 16  # threads for blocking vector index queries
+    QUERY_ENCODE_BATCH_SIZE: int = 32  # max concurrent queries encoded in one batch
+    QUERY_ENCODE_MAX_WAIT_MS: float = 5.0  # how long a query waits for others to join its batch
+    QUERY_EMBEDDING_CACHE_SIZE: int = 1024
+    
+    # Answer Cache Settings
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIZE: int = 1000
+    ANSWER_CACHE_TTL_SECONDS: int = 3600
+    ANSWER_CACHE_SIMILARITY: float = 0.95  # min cosine similarity for a near-duplicate question to hit
+    CORPUS_VERSION_PATH: str = "./cache/corpus_version.sqlite3"  # shared by API workers to invalidate their caches
+    
     # Embedding Model
     EMBEDDING_MODEL: str = "BAAI/bge-base-en-v1.5"
+    EMBEDDING_BACKEND: str = "torch"  # "torch" (SentenceTransformer) or "onnx" (exported once, run on ONNX Runtime)
+    EMBEDDING_ONNX_DIR: str = "./cache/onnx"
+    EMBEDDING_ONNX_QUANTIZE: bool = False  # dynamic int8 weights: faster on CPU, cosine ~0.99 to PyTorch
+    EMBEDDING_ONNX_THREADS: int = 0  # intra-op threads; 0 uses every physical core
+    EMBEDDING_BATCH_TOKENS: int = 16384  # padded tokens per encode batch (batch size x longest chunk)
+    EMBEDDING_MAX_BATCH_SIZE: int = 256
+    EMBEDDING_CACHE_ENABLED: bool = True
+    EMBEDDING_CACHE_DIR: str = "./cache/embeddings"
+    EMBEDDING_CACHE_DTYPE: str = "float16"  # float16 halves disk use; float32 keeps full precision
     
     # Mistral Settings
     MISTRAL_BASE_URL: str = ""
     MISTRAL_MODEL: str = "mistral"
+    OLLAMA_MAX_CONNECTIONS: int = 8  # pooled keep-alive connections; further generations wait for one
+    OLLAMA_KEEP_ALIVE: str = "30m"  # how long Ollama keeps the model loaded after a request; "-1" keeps it forever, "0" unloads at once
+    OLLAMA_NUM_CTX: int = 8192  # context window; must fit the system prompt, packed context and answer
+    OLLAMA_NUM_THREAD: int = 0  # CPU threads for generation; 0 lets Ollama decide
+    OLLAMA_NUM_BATCH: int = 512  # prompt tokens evaluated per batch during prefill
+    CONTEXT_MAX_TOKENS: int = 2000  # retrieved context packed into the prompt
+    CONTEXT_TOKENIZER: str = ""  # Hugging Face tokenizer used to count tokens; empty estimates from length
     
     # Chunking Settings
     PDF_CHUNK_SIZE: int = 1000
@@ -35,6 +93,33 @@ class Settings(BaseSettings):
     EXCEL_ROWS_PER_CHUNK: int = 5
     PPT_CHARS_PER_CHUNK: int = 1000
     PPT_OVERLAP: int = 100
+    PDF_EXTRACTION_WORKERS: int = 1  # >1 splits PDF pages across a process pool
+    
+    # OCR Settings
+    OCR_BATCH_SIZE: int = 8  # images sent to PaddleOCR per inference call
+    OCR_CACHE_ENABLED: bool = True
+    OCR_CACHE_PATH: str = "./cache/ocr_cache.sqlite3"
+    OCR_CACHE_MAX_MB: int = 256
+    OCR_MIN_IMAGE_AREA: int = 4096  # pixels; smaller images (icons, bullets) are skipped
+    OCR_MIN_EDGE_DENSITY: float = 0.02  # 0 disables the edge check
+    OCR_SKIP_DENSE_TEXT_CHARS: int = 2000  # skip images on pages with this much native text; 0 disables
+    
+    # Ingestion Queue Settings
+    INGESTION_WORKERS: int = 1  # documents ingested concurrently
+    INGESTION_QUEUE_SIZE: int = 100  # uploads waiting before new ones are rejected
+    INGESTION_BATCH_SIZE: int = 100  # chunks embedded and upserted per rolling batch
+    INGESTION_EMBED_WORKERS: int = 1  # concurrent encode calls
+    INGESTION_UPSERT_WORKERS: int = 2  # concurrent vector index upserts
+    INGESTION_STAGE_QUEUE_SIZE: int = 4  # batches buffered between pipeline stages
+    INGESTION_INCREMENTAL: bool = True  # re-uploads only embed and upsert changed chunks
+    
+    # Upsert Settings
+    UPSERT_MAX_REQUEST_BYTES: int = 2 * 1024 * 1024  # Pinecone's request size limit
+    UPSERT_MAX_BATCH_VECTORS: int = 1000  # Pinecone's vectors-per-request limit
+    UPSERT_CONCURRENCY: int = 4  # requests in flight across all upserts
+    UPSERT_MAX_RETRIES: int = 5  # retries of a request failing with a transient error (429, 5xx, timeouts)
+    UPSERT_BACKOFF_SECONDS: float = 0.5  # first retry delay, doubled on each attempt
+    UPSERT_MAX_RESUMES: int = 2  # times a failed batch is resumed from its last acknowledged request
     
     class Config:
         env_file = ".env"
@@ -1,13 +1,22 @@
-from app.services.embedding_service import EmbeddingService
+import asyncio
+from typing import Optional
+from app.services.embedding_service import EmbeddingService, embedding_model
 from app.services.document_service import DocumentService
+from app.services.answer_cache import AnswerCache
 from app.services.query_service import QueryService
+from app.services.rerank_service import RerankService
 from app.services.file_service import FileService
 from app.core.config import settings
+from app.utils.context_packer import token_counter
+from app.utils.doc_loader import ocr_model, shutdown_pdf_pool
+from app.utils.lazy_model import registered_models
+from app.utils.mistral_client import close_async_client
 
 # Singleton instances
 _embedding_service = None
 _document_service = None
 _query_service = None
+_rerank_service = None
 _file_service = None
 
 def get_settings():
@@ -29,12 +38,30 @@ def get_document_service() -> DocumentService:
         _document_service = DocumentService(embedding_service)
     return _document_service
 
+def get_rerank_service() -> Optional[RerankService]:
+    """Get singleton rerank service, or None when reranking is disabled."""
+    global _rerank_service
+    if _rerank_service is None and settings.RERANK_ENABLED:
+        _rerank_service = RerankService(
+            settings.RERANK_MODEL,
+            batch_size=settings.RERANK_BATCH_SIZE,
+            cache_size=settings.RERANK_CACHE_SIZE
+        )
+    return _rerank_service
+
 def get_query_service() -> QueryService:
     """Get singleton query service."""
     global _query_service
     if _query_service is None:
         embedding_service = get_embedding_service()
-        _query_service = QueryService(embedding_service)
+        answer_cache = None
+        if settings.ANSWER_CACHE_ENABLED:
+            answer_cache = AnswerCache(
+                max_entries=settings.ANSWER_CACHE_SIZE,
+                ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+                similarity_threshold=settings.ANSWER_CACHE_SIMILARITY
+            )
+        _query_service = QueryService(embedding_service, get_rerank_service(), answer_cache)
     return _query_service
 
 def get_file_service() -> FileService:
@@ -45,3 +72,43 @@ def get_file_service() -> FileService:
         _file_service = FileService(embedding_service)
     return _file_service
 
+def model_status() -> dict:
+    """Load state of every model, and whether all enabled ones are ready."""
+    get_rerank_service()  # registers the reranker's model when reranking is enabled
+    models = {name: model.status() for name, model in registered_models().items()}
+    ready = all(status["state"] == "ready" for status in models.values() if status["state"] != "disabled")
+    return {"ready": ready, "models": models}
+
+def _warm_up_models():
+    # Query-path models first, OCR (only needed for uploads) last
+    rerank_service = get_rerank_service()
+    models = [embedding_model, token_counter] + ([rerank_service.lazy_model] if rerank_service else []) + [ocr_model]
+    for model in models:
+        if not model.enabled:
+            continue
+        try:
+            model.get()
+        except Exception as e:
+            print(f"⚠️ Warm-up could not load the {model.name} model: {e}")
+
+async def warm_up_models():
+    """Load models in a worker thread so requests are served while they load."""
+    await asyncio.to_thread(_warm_up_models)
+
+async def recover_ingestion_jobs():
+    """Requeue uploads interrupted by the last shutdown, building the services off the event loop."""
+    try:
+        document_service = await asyncio.to_thread(get_document_service)
+        await document_service.recover_jobs()
+    except Exception as e:
+        print(f"⚠️ Could not recover interrupted ingestion jobs: {e}")
+
+async def shutdown_services():
+    """Stop background workers owned by the singleton services."""
+    if _document_service is not None:
+        await _document_service.queue.shutdown()
+        _document_service.pipeline.shutdown()
+    shutdown_pdf_pool()
+    if _embedding_service is not None:
+        _embedding_service.shutdown()
+    await close_async_client()
@@ -1,6 +1,7 @@
 import multiprocessing
 multiprocessing.set_start_method("spawn", force=True)
 
+import asyncio
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
@@ -9,14 +10,23 @@ import os
 from app.core.config import settings
 from app.api.v1.router import api_router
 from app.core.database import connect_to_mongo, close_mongo_connection
+from app.dependencies import recover_ingestion_jobs, shutdown_services, warm_up_models
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
     await connect_to_mongo()
     os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    # Models load in the background; health, file listing and /ready respond meanwhile
+    warmup = asyncio.create_task(warm_up_models()) if settings.MODEL_WARMUP else None
+    # Uploads left queued or processing by the last shutdown are requeued (or marked failed)
+    recovery = asyncio.create_task(recover_ingestion_jobs())
     yield
     # Shutdown
+    for task in (warmup, recovery):
+        if task is not None:
+            task.cancel()
+    await shutdown_services()
     await close_mongo_connection()
 
 def create_app() -> FastAPI:
@@ -0,0 +1,48 @@
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from beanie import Document
+from pydantic import Field
+
+class DocumentCollection(Document):
+    """Uploaded document and its processing state."""
+    filename: str
+    original_filename: str
+    file_type: str
+    file_size: int = 0
+    chunk_size: int
+    overlap: int
+    status: str = "processing"  # queued / processing / completed / failed
+    stage: Optional[str] = None  # saved / converted / extracted / embedded / indexed
+    error_message: Optional[str] = None
+    total_chunks: int = 0
+    total_pages: Optional[int] = None
+    total_slides: Optional[int] = None
+    sheet_names: List[str] = Field(default_factory=list)
+    ocr_stats: Optional[Dict[str, Any]] = None
+    pipeline_stats: Optional[Dict[str, Any]] = None
+    uploaded_at: datetime = Field(default_factory=datetime.utcnow)
+    processed_at: Optional[datetime] = None
+    recovered_at: Optional[datetime] = None  # requeued after a restart interrupted the job
+
+    class Settings:
+        name = "document_collections"
+
+class VectorMetadata(Document):
+    """Per-chunk metadata for a vector stored in the vector index (text is not stored)."""
+    vector_id: str
+    document_filename: str
+    chunk_index: int
+    chunk_hash: Optional[str] = None  # normalized chunk text hash, used to diff re-uploads
+    page: Optional[int] = None
+    slide: Optional[int] = None
+    sheet: Optional[str] = None
+    start_row: Optional[int] = None
+    end_row: Optional[int] = None
+    chunk_length: int = 0
+    has_images: bool = False
+    image_count: int = 0
+    embedding_model: str
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+
+    class Settings:
+        name = "vector_metadata"
@@ -0,0 +1,43 @@
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel
+
+class QueryRequest(BaseModel):
+    question: str
+    top_k: int = 5
+
+class AnswerChunk(BaseModel):
+    text: str
+    source: str
+    score: float
+    page: Optional[int] = None
+    slide: Optional[int] = None
+    sheet: Optional[str] = None
+    start_row: Optional[int] = None
+    end_row: Optional[int] = None
+
+class QueryResponse(BaseModel):
+    answer: str
+    references: List[AnswerChunk]
+
+class UploadResponse(BaseModel):
+    message: str
+    filename: str
+    job_id: Optional[str] = None
+    status: Optional[str] = None
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    filename: str
+    status: str
+    stage: Optional[str] = None
+    total_chunks: int = 0
+    ocr_stats: Optional[Dict[str, Any]] = None
+    pipeline_stats: Optional[Dict[str, Any]] = None
+    error_message: Optional[str] = None
+
+class FileListResponse(BaseModel):
+    files: List[str]
+
+class DeleteResponse(BaseModel):
+    status: str
+    message: str
@@ -0,0 +1,107 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+from app.models.schemas import QueryResponse
+
+class AnswerCache:
+    """Two-level cache of generated answers.
+
+    Level one is an exact match on the normalized question and top_k. Level
+    two compares the query embedding against cached questions with the same
+    top_k and returns an answer whose cosine similarity is at least
+    ``similarity_threshold``. Entries expire after ``ttl_seconds`` and the
+    least recently used are evicted beyond ``max_entries``. Every lookup
+    carries the corpus version, and the whole cache is dropped when it changes.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl_seconds: float = 3600, similarity_threshold: float = 0.95):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_threshold = similarity_threshold
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # (question, top_k) -> entry
+        self._version = None
+        self._matrix = None  # stacked embeddings for semantic lookups, rebuilt lazily
+        self._keys = []
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(question: str) -> str:
+        return " ".join(question.lower().split()).rstrip("?!. ")
+
+    def _sync(self, version: int) -> bool:
+        """Drop entries from older corpus versions and expired ones; False if ``version`` is stale."""
+        if self._version is None or version > self._version:
+            self._entries.clear()
+            self._version = version
+            self._matrix = None
+        now = time.monotonic()
+        expired = [key for key, entry in self._entries.items() if now - entry["created"] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+        return version == self._version
+
+    def get_exact(self, question: str, top_k: int, version: int) -> Optional[QueryResponse]:
+        key = (self.normalize(question), top_k)
+        with self._lock:
+            entry = self._entries.get(key) if self._sync(version) else None
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            self.exact_hits += 1
+            return entry["response"]
+
+    def get_similar(self, embedding: np.ndarray, top_k: int, version: int) -> Optional[QueryResponse]:
+        with self._lock:
+            if not self._sync(version) or not self._entries:
+                self.misses += 1
+                return None
+            if self._matrix is None:
+                self._keys = list(self._entries)
+                self._matrix = np.stack([self._entries[key]["embedding"] for key in self._keys])
+
+            scores = self._matrix @ self._unit(embedding)
+            for i in np.argsort(-scores):
+                if scores[i] < self.similarity_threshold:
+                    break
+                key = self._keys[i]
+                if key[1] == top_k and key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.semantic_hits += 1
+                    return self._entries[key]["response"]
+            self.misses += 1
+            return None
+
+    def put(self, question: str, top_k: int, version: int, embedding: np.ndarray, response: QueryResponse):
+        key = (self.normalize(question), top_k)
+        with self._lock:
+            if not self._sync(version):
+                return
+            self._entries[key] = {
+                "response": response,
+                "embedding": self._unit(embedding),
+                "created": time.monotonic(),
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    @staticmethod
+    def _unit(embedding: np.ndarray) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32)
+        return embedding / max(float(np.linalg.norm(embedding)), 1e-12)
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+        }
@@ -1,25 +1,53 @@
+import asyncio
+import contextlib
 import os
 import shutil
+import time
 from datetime import datetime
+from beanie import BulkWriter, PydanticObjectId
+from beanie.operators import In, NotIn, Set
 from fastapi import UploadFile, HTTPException
 from docx2pdf import convert
 from app.core.config import settings
 from app.models.mongo_models import DocumentCollection, VectorMetadata
+from app.models.schemas import JobStatusResponse
 from app.services.embedding_service import EmbeddingService
-from app.utils.doc_loader import load_and_chunk_pdf, load_and_chunk_excel, load_and_chunk_ppt
+from app.services.ingestion_pipeline import IngestionPipeline
+from app.services.ingestion_queue import IngestionQueue
+from app.utils.embedding_cache import EmbeddingCache
+from app.utils.doc_loader import iter_pdf_chunks, iter_excel_chunks, iter_ppt_chunks
+from app.utils.ocr_filter import OCRSkipFilter
 from app.utils.ppt_converter import ppt_to_pptx_soffice
 
+# Start of this launch; backend_run.py shares it with every API worker, so recovery never
+# takes over a job another worker of the same launch is running
+LAUNCHED_AT = datetime.utcfromtimestamp(float(os.environ.setdefault("INGESTION_LAUNCHED_AT", str(time.time()))))
+
 class DocumentService:
     """Service for processing and managing documents."""
-    
+
     def __init__(self, embedding_service: EmbeddingService):
         self.embedding_service = embedding_service
-    
+        self.queue = IngestionQueue(
+            self._run_job,
+            workers=settings.INGESTION_WORKERS,
+            max_size=settings.INGESTION_QUEUE_SIZE
+        )
+        self.pipeline = IngestionPipeline(
+            embedding_service,
+            batch_size=settings.INGESTION_BATCH_SIZE,
+            extract_workers=settings.INGESTION_WORKERS,
+            embed_workers=settings.INGESTION_EMBED_WORKERS,
+            upsert_workers=settings.INGESTION_UPSERT_WORKERS,
+            queue_size=settings.INGESTION_STAGE_QUEUE_SIZE,
+            upsert_resumes=settings.UPSERT_MAX_RESUMES
+        )
+        self._file_locks = {}  # filename -> [lock, users]; jobs for the same file run in upload order
+
     async def process_upload(self, file: UploadFile):
-        """Process uploaded file and create embeddings with MongoDB tracking."""
-        save_path = os.path.join(settings.UPLOAD_DIR, file.filename)
-        print(f"Processing upload: {save_path}")
-        
+        """Save the uploaded file and queue it for background ingestion."""
+        print(f"Processing upload: {file.filename}")
+
         # Create document collection record
         doc_collection = DocumentCollection(
             filename=file.filename,
@@ -28,122 +56,402 @@ class DocumentService:
             file_size=0,  # Will update after saving
             chunk_size=settings.PDF_CHUNK_SIZE,
             overlap=settings.PDF_CHUNK_OVERLAP,
-            status="processing"
+            status="queued"
         )
         await doc_collection.create()
-        
+
+        # Staged under a job-unique name, so a re-upload never overwrites a file being ingested;
+        # the job moves it into place once earlier jobs for the same file are done
+        save_path = self._staged_path(doc_collection)
         try:
-            # Save file to disk
-            with open(save_path, "wb") as buffer:
-                shutil.copyfileobj(file.file, buffer)
-            
+            # Save file to disk; not on the ingestion executor, which may be busy with another job
+            await asyncio.to_thread(self._save_file, file, save_path)
+
             # Update file size
             doc_collection.file_size = os.path.getsize(save_path)
+            doc_collection.stage = "saved"
             await doc_collection.save()
-            
-            ext = os.path.splitext(save_path)[1].lower()
-            flag = 0
-            
-            # Handle file conversions
-            if ext == ".ppt":
-                try:
-                    save_path = ppt_to_pptx_soffice(save_path)
-                    ext = ".pptx"
-                    os.remove(os.path.splitext(save_path)[0] + ".ppt")
-                except Exception as e:
-                    doc_collection.status = "failed"
-                    doc_collection.error_message = f"PPT conversion failed: {e}"
-                    await doc_collection.save()
-                    raise HTTPException(status_code=422, detail=f"PPT conversion failed: {e}")
-            
-            if ext in ['.doc', '.docx']:
-                convert(save_path, settings.UPLOAD_DIR)
-                pdf_path = os.path.splitext(save_path)[0] + ".pdf"
-                flag = 1
-            else:
-                pdf_path = save_path
-            
-            # Process based on file type and get chunks + metadata
-            if ext in ['.xlsx', '.xls']:
-                chunks, metadata = load_and_chunk_excel(save_path)
-                # Get sheet names for MongoDB
-                import pandas as pd
-                with pd.ExcelFile(save_path) as xls:
-                    doc_collection.sheet_names = list(xls.sheet_names)
-            elif ext == '.pptx':
-                chunks, metadata = load_and_chunk_ppt(save_path)
-                # Count slides
-                from pptx import Presentation
-                prs = Presentation(save_path)
-                doc_collection.total_slides = len(prs.slides)
+
+            self.queue.submit({"document_id": doc_collection.id, "filename": file.filename})
+        except asyncio.QueueFull:
+            await self._fail(doc_collection, "Ingestion queue is full")
+            if os.path.exists(save_path):
+                os.remove(save_path)
+            raise HTTPException(status_code=503, detail="Ingestion queue is full, please retry later")
+        except Exception as e:
+            await self._fail(doc_collection, str(e))
+            if os.path.exists(save_path):
+                os.remove(save_path)
+            raise HTTPException(status_code=500, detail=f"Upload failed: {str(e)}")
+
+        return {
+            "message": f"{file.filename} uploaded and queued for processing.",
+            "filename": file.filename,
+            "job_id": str(doc_collection.id),
+            "status": doc_collection.status,
+            "document_id": str(doc_collection.id)
+        }
+
+    async def get_job_status(self, job_id: str) -> JobStatusResponse:
+        """Return the ingestion status recorded on the document collection."""
+        try:
+            doc_collection = await DocumentCollection.get(PydanticObjectId(job_id))
+        except Exception:
+            doc_collection = None
+
+        if not doc_collection:
+            raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+        return JobStatusResponse(
+            job_id=str(doc_collection.id),
+            filename=doc_collection.filename,
+            status=doc_collection.status,
+            stage=doc_collection.stage,
+            total_chunks=doc_collection.total_chunks,
+            ocr_stats=doc_collection.ocr_stats,
+            pipeline_stats=doc_collection.pipeline_stats,
+            error_message=doc_collection.error_message
+        )
+
+    async def recover_jobs(self):
+        """Requeue uploads a previous run left queued or processing.
+
+        A job is requeued once if its file is still on disk (staged, or moved
+        into place by a job that was processing); otherwise, or if it was
+        interrupted again after a recovery, it is marked failed. Each
+        record is claimed with a conditional update, so with several workers
+        only one of them acts on it.
+        """
+        stale = await DocumentCollection.find(
+            In(DocumentCollection.status, ["queued", "processing"]),
+            DocumentCollection.uploaded_at < LAUNCHED_AT
+        ).to_list()
+        for doc_collection in stale:
+            if doc_collection.recovered_at is not None and doc_collection.recovered_at >= LAUNCHED_AT:
+                continue  # already requeued by a worker of this launch
+            staged_path = self._staged_path(doc_collection)
+            requeue = doc_collection.recovered_at is None and (
+                os.path.exists(staged_path)
+                or doc_collection.status == "processing"
+                and os.path.exists(os.path.join(settings.UPLOAD_DIR, doc_collection.filename))
+            )
+            if requeue:
+                update = {DocumentCollection.status: "queued", DocumentCollection.stage: "saved"}
             else:
-                chunks, metadata = load_and_chunk_pdf(pdf_path)
-                # Count pages
-                import fitz
-                doc = fitz.open(pdf_path)
-                doc_collection.total_pages = len(doc)
-                doc.close()
-            
-            if not chunks:
-                doc_collection.status = "failed"
-                doc_collection.error_message = "No content could be extracted"
+                update = {
+                    DocumentCollection.status: "failed",
+                    DocumentCollection.error_message: "Interrupted by a server restart, please upload again",
+                }
+            update[DocumentCollection.recovered_at] = datetime.utcnow()
+            result = await DocumentCollection.find_one(
+                DocumentCollection.id == doc_collection.id,
+                DocumentCollection.recovered_at == doc_collection.recovered_at
+            ).update(Set(update))
+            if not result.modified_count:
+                continue
+
+            print(f"♻️ {'Requeued' if requeue else 'Failed'} interrupted job for {doc_collection.filename}")
+            if requeue:
+                try:
+                    self.queue.submit({"document_id": doc_collection.id, "filename": doc_collection.filename})
+                except asyncio.QueueFull:
+                    await self._fail(doc_collection, "Ingestion queue is full")
+                    if os.path.exists(staged_path):
+                        os.remove(staged_path)
+            elif os.path.exists(staged_path):
+                os.remove(staged_path)
+
+    async def _run_job(self, job: dict):
+        """Run a queued upload once earlier jobs for the same file are done."""
+        doc_collection = await DocumentCollection.get(job["document_id"])
+        if not doc_collection:
+            return
+
+        # Stays queued while an earlier upload of the same file is being ingested
+        async with self._file_lock(job["filename"]):
+            await self._ingest(doc_collection, job["filename"])
+
+    async def _ingest(self, doc_collection: DocumentCollection, filename: str):
+        """Run the ingestion pipeline for an upload, recording each stage."""
+        save_path = os.path.join(settings.UPLOAD_DIR, filename)
+        flag = 0
+
+        doc_collection.status = "processing"
+        await doc_collection.save()
+
+        indexed_ids = []
+        attempted_ids = []  # sent to the index, possibly only in part
+        chunks = records = None
+        existing = {}
+
+        try:
+            # Move the staged upload into place (a recovered job may find it there already)
+            staged_path = self._staged_path(doc_collection)
+            if os.path.exists(staged_path):
+                await asyncio.to_thread(os.replace, staged_path, save_path)
+
+            # Handle file conversions
+            save_path, pdf_path, ext, flag = await self.queue.run_blocking(self._convert, save_path)
+            await self._set_stage(doc_collection, "converted")
+
+            doc_info = await self.queue.run_blocking(self._document_info, save_path, pdf_path, ext)
+            for key, value in doc_info.items():
+                setattr(doc_collection, key, value)
+
+            # Chunks flow through extract → embed → upsert stages while extraction continues,
+            # so memory stays bounded and the first vectors land before the last page is read
+            ocr_filter = OCRSkipFilter.from_settings()
+            sheet_names = []
+            chunks = self._iter_chunks(save_path, pdf_path, ext, ocr_filter, sheet_names)
+
+            # Chunks already indexed for a previous upload of this file are diffed by hash,
+            # so only new or changed chunks are embedded and upserted
+            existing = {
+                meta.vector_id: meta
+                for meta in await VectorMetadata.find(VectorMetadata.document_filename == filename).to_list()
+            }
+            diff = {"positions": {}, "seen": set(), "moved": [], "unchanged": 0}
+            records = self._diff_records(filename, chunks, existing, diff)
+
+            async def on_stage(stage: str):
+                if stage == "extracted":
+                    if ext in ['.xlsx', '.xls']:
+                        doc_collection.sheet_names = sheet_names
+                    else:
+                        doc_collection.ocr_stats = ocr_filter.report()
+                await self._set_stage(doc_collection, stage)
+
+            async def on_indexed(vector_ids: list, metadata: list):
+                # Replace metadata of re-upserted chunks, then bulk insert (WITHOUT storing text)
+                replaced = [vector_id for vector_id in vector_ids if vector_id in existing]
+                if replaced:
+                    await VectorMetadata.find(In(VectorMetadata.vector_id, replaced)).delete()
+                vector_metadata_list = self._vector_metadata(filename, vector_ids, metadata, diff["positions"])
+                indexed_ids.extend(vector_ids)
+                await VectorMetadata.insert_many(vector_metadata_list)
+                doc_collection.total_chunks = diff["unchanged"] + len(indexed_ids)
                 await doc_collection.save()
-                raise HTTPException(status_code=422, detail="No content could be extracted from the file")
-            
-            # Update document collection with chunk count
-            doc_collection.total_chunks = len(chunks)
-            await doc_collection.save()
-            
-            # Create vector metadata records (WITHOUT storing text)
-            vector_metadata_list = []
-            for i, meta in enumerate(metadata):
-                vector_id = f"{file.filename}_{i}"
-                
-                vector_meta = VectorMetadata(
-                    vector_id=vector_id,
-                    document_filename=file.filename,
-                    chunk_index=i,
-                    page=meta.get('page'),
-                    slide=meta.get('slide'),
-                    sheet=meta.get('sheet'),
-                    start_row=meta.get('start_row'),
-                    end_row=meta.get('end_row'),
-                    chunk_length=len(meta.get('text', '')),
-                    has_images=meta.get('has_images', False),
-                    image_count=meta.get('image_count', 0),
-                    embedding_model=settings.EMBEDDING_MODEL
-                )
-                vector_metadata_list.append(vector_meta)
-            
-            # Bulk insert vector metadata
-            await VectorMetadata.insert_many(vector_metadata_list)
-            
-            # Create embeddings and store in Pinecone (text not stored in MongoDB)
-            self.embedding_service.embed_and_upsert(chunks, metadata)
-            
+
+            pipeline_stats = await self.pipeline.run(records, on_indexed, on_stage, on_upsert=attempted_ids.extend)
+
+            # Drop vectors the new version no longer produces and re-number unchanged chunks that moved
+            orphaned_ids = [vector_id for vector_id in existing if vector_id not in diff["seen"]]
+            if orphaned_ids:
+                await self.queue.run_blocking(self.embedding_service.delete_vectors, orphaned_ids)
+                await VectorMetadata.find(In(VectorMetadata.vector_id, orphaned_ids)).delete()
+            if diff["moved"]:
+                async with BulkWriter() as bulk_writer:
+                    for meta in diff["moved"]:
+                        await meta.replace(bulk_writer=bulk_writer)
+
+            pipeline_stats["incremental"] = {
+                "unchanged": diff["unchanged"],
+                "upserted": len(indexed_ids),
+                "deleted": len(orphaned_ids),
+            }
+            doc_collection.pipeline_stats = pipeline_stats
+            doc_collection.total_chunks = diff["unchanged"] + len(indexed_ids)
+            print(f"📈 Pipeline stats for {filename}: {doc_collection.pipeline_stats}")
+
             # Mark as completed
+            doc_collection.stage = "indexed"
             doc_collection.status = "completed"
             doc_collection.processed_at = datetime.utcnow()
             await doc_collection.save()
-            
+
+            # The new upload supersedes earlier records for the same file; later uploads
+            # and jobs another API worker is still running keep theirs
+            await DocumentCollection.find(
+                DocumentCollection.filename == filename,
+                DocumentCollection.id < doc_collection.id,
+                NotIn(DocumentCollection.status, ["queued", "processing"])
+            ).delete()
+
             # Cleanup temporary files
             if flag:
                 os.remove(save_path)
-            
-            return {
-                "message": f"{file.filename} uploaded and processed successfully!",
-                "filename": file.filename,
-                "chunks_created": len(chunks),
-                "document_id": str(doc_collection.id)
-            }
-            
+
+            print(f"✅ Ingested {filename}: {len(indexed_ids)} chunks")
+
         except Exception as e:
-            # Update error status
-            doc_collection.status = "failed"
-            doc_collection.error_message = str(e)
-            await doc_collection.save()
-            
+            await self._fail(doc_collection, str(e))
+
+            # Stop extraction (and any PDF worker pool) behind the failed batch
+            for generator in (records, chunks):
+                if generator is not None:
+                    try:
+                        await self.queue.run_blocking(generator.close)
+                    except ValueError:
+                        pass  # still running on an extract thread; it finishes its batch and is dropped
+
+            # Roll back vectors added by batches that were sent, including requests of a batch
+            # that failed part-way. Chunks that overwrote a previous version's vector keep their new content.
+            added_ids = [vector_id for vector_id in attempted_ids if vector_id not in existing]
+            if added_ids:
+                try:
+                    await self.queue.run_blocking(self.embedding_service.delete_vectors, added_ids)
+                    await VectorMetadata.find(In(VectorMetadata.vector_id, added_ids)).delete()
+                except Exception as cleanup_error:
+                    print(f"❌ Failed to roll back vectors for {filename}: {cleanup_error}")
+
             # Cleanup on error
             if os.path.exists(save_path):
                 os.remove(save_path)
-            raise HTTPException(status_code=500, detail=f"Processing failed: {str(e)}")
+
+    @contextlib.asynccontextmanager
+    async def _file_lock(self, filename: str):
+        entry = self._file_locks.setdefault(filename, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._file_locks[filename]
+
+    @staticmethod
+    def _staged_path(doc_collection: DocumentCollection) -> str:
+        return os.path.join(settings.UPLOAD_DIR, ".incoming", f"{doc_collection.id}_{doc_collection.filename}")
+
+    @staticmethod
+    def _save_file(file: UploadFile, save_path: str):
+        os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        with open(save_path, "wb") as buffer:
+            shutil.copyfileobj(file.file, buffer)
+
+    @staticmethod
+    def _convert(save_path: str):
+        """Convert .ppt to .pptx and .doc/.docx to PDF. Returns (save_path, pdf_path, ext, flag)."""
+        ext = os.path.splitext(save_path)[1].lower()
+        flag = 0
+
+        if ext == ".ppt":
+            try:
+                save_path = ppt_to_pptx_soffice(save_path)
+                ext = ".pptx"
+                os.remove(os.path.splitext(save_path)[0] + ".ppt")
+            except Exception as e:
+                raise RuntimeError(f"PPT conversion failed: {e}")
+
+        if ext in ['.doc', '.docx']:
+            convert(save_path, settings.UPLOAD_DIR)
+            pdf_path = os.path.splitext(save_path)[0] + ".pdf"
+            flag = 1
+        else:
+            pdf_path = save_path
+
+        return save_path, pdf_path, ext, flag
+
+    @staticmethod
+    def _iter_chunks(save_path: str, pdf_path: str, ext: str, ocr_filter: OCRSkipFilter, sheet_names: list):
+        """Return a generator of (chunk, metadata) pairs for the document."""
+        if ext in ['.xlsx', '.xls']:
+            # Sheet names are collected while streaming so the workbook is opened only once
+            return iter_excel_chunks(
+                save_path, rows_per_chunk=settings.EXCEL_ROWS_PER_CHUNK, sheet_names=sheet_names
+            )
+        if ext == '.pptx':
+            return iter_ppt_chunks(save_path, ocr_batch_size=settings.OCR_BATCH_SIZE, ocr_filter=ocr_filter)
+        return iter_pdf_chunks(
+            pdf_path,
+            workers=settings.PDF_EXTRACTION_WORKERS,
+            ocr_batch_size=settings.OCR_BATCH_SIZE,
+            ocr_filter=ocr_filter
+        )
+
+    @staticmethod
+    def _diff_records(filename: str, chunks, existing: dict, diff: dict):
+        """Yield (vector_id, chunk, metadata) for chunks that need embedding and upserting.
+
+        Vector ids are derived from the chunk hash, so an unchanged chunk keeps its
+        id across uploads even when earlier content is inserted or removed. Chunks
+        whose id and location match an ``existing`` record are skipped (only counted
+        in ``diff``) unless incremental ingestion is disabled.
+        """
+        occurrences = {}
+        chunk_index = -1
+        for chunk_index, (chunk, meta) in enumerate(chunks):
+            chunk_hash = EmbeddingCache.key(chunk)
+            occurrence = occurrences.get(chunk_hash, 0)
+            occurrences[chunk_hash] = occurrence + 1
+            vector_id = f"{filename}_{chunk_hash[:16]}" + (f"_{occurrence}" if occurrence else "")
+            diff["seen"].add(vector_id)
+
+            previous = existing.get(vector_id)
+            if settings.INGESTION_INCREMENTAL and previous is not None and DocumentService._unchanged(previous, meta):
+                diff["unchanged"] += 1
+                if previous.chunk_index != chunk_index:
+                    previous.chunk_index = chunk_index
+                    diff["moved"].append(previous)
+                continue
+
+            diff["positions"][vector_id] = (chunk_index, chunk_hash)
+            yield vector_id, chunk, meta
+
+        if chunk_index < 0:
+            raise ValueError("No content could be extracted")
+
+    @staticmethod
+    def _unchanged(previous: VectorMetadata, meta: dict) -> bool:
+        """True if a stored chunk with the same hash can be reused as-is."""
+        return (
+            previous.embedding_model == settings.EMBEDDING_MODEL
+            and previous.page == meta.get('page')
+            and previous.slide == meta.get('slide')
+            and previous.sheet == meta.get('sheet')
+            and previous.start_row == meta.get('start_row')
+            and previous.end_row == meta.get('end_row')
+        )
+
+    @staticmethod
+    def _document_info(save_path: str, pdf_path: str, ext: str) -> dict:
+        """Collect page/slide counts for MongoDB (sheet names are gathered during chunking)."""
+        doc_info = {}
+        if ext == '.pptx':
+            # Count slides
+            from pptx import Presentation
+            prs = Presentation(save_path)
+            doc_info["total_slides"] = len(prs.slides)
+        elif ext not in ['.xlsx', '.xls']:
+            # Count pages
+            import fitz
+            doc = fitz.open(pdf_path)
+            doc_info["total_pages"] = len(doc)
+            doc.close()
+        return doc_info
+
+    @staticmethod
+    def _vector_metadata(filename: str, vector_ids: list, metadata: list, positions: dict) -> list:
+        """Create vector metadata records for a batch of chunks."""
+        vector_metadata_list = []
+        for vector_id, meta in zip(vector_ids, metadata):
+            chunk_index, chunk_hash = positions[vector_id]
+            vector_meta = VectorMetadata(
+                vector_id=vector_id,
+                document_filename=filename,
+                chunk_index=chunk_index,
+                chunk_hash=chunk_hash,
+                page=meta.get('page'),
+                slide=meta.get('slide'),
+                sheet=meta.get('sheet'),
+                start_row=meta.get('start_row'),
+                end_row=meta.get('end_row'),
+                chunk_length=len(meta.get('text', '')),
+                has_images=meta.get('has_images', False),
+                image_count=meta.get('image_count', 0),
+                embedding_model=settings.EMBEDDING_MODEL
+            )
+            vector_metadata_list.append(vector_meta)
+        return vector_metadata_list
+
+    @staticmethod
+    async def _set_stage(doc_collection: DocumentCollection, stage: str):
+        doc_collection.stage = stage
+        await doc_collection.save()
+
+    @staticmethod
+    async def _fail(doc_collection: DocumentCollection, message: str):
+        doc_collection.status = "failed"
+        doc_collection.error_message = message
+        await doc_collection.save()
@@ -0,0 +1,91 @@
+import threading
+import time
+from typing import List, Optional
+import numpy as np
+
+class EmbeddingScheduler:
+    """Length-bucketed dynamic batching for ``model.encode``.
+
+    Texts are sorted by token count into length buckets whose bounds grow by
+    a factor of sqrt(2), so padding within a batch stays under ~30%. Each
+    bucket is cut into batches whose padded size (batch size x longest text)
+    stays within ``max_batch_tokens``: short chunks such as spreadsheet rows
+    are encoded many at a time, long PDF chunks a few at a time. Results
+    are returned in input order, and token, padding and timing counters
+    accumulate across calls.
+    """
+
+    COUNTERS = ("texts", "batches", "tokens", "padded_tokens", "seconds")
+
+    def __init__(self, max_batch_tokens: int = 16384, max_batch_size: int = 256):
+        self.max_batch_tokens = max_batch_tokens
+        self.max_batch_size = max_batch_size
+        self._counters = dict.fromkeys(self.COUNTERS, 0)
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def bucket(length: int) -> int:
+        return int(2 * np.log2(max(length, 1)))
+
+    def plan(self, lengths: List[int]) -> List[np.ndarray]:
+        """Group text indexes into batches, shortest texts first."""
+        order = np.argsort(lengths, kind="stable")
+        batches, start = [], 0
+        for end in range(1, len(order) + 1):
+            # Sorted ascending, so the text just added is the longest in the batch
+            if end < len(order):
+                size, longest = end + 1 - start, max(lengths[order[end]], 1)
+                same_bucket = self.bucket(longest) == self.bucket(lengths[order[start]])
+                if same_bucket and size <= self.max_batch_size and size * longest <= self.max_batch_tokens:
+                    continue
+            batches.append(order[start:end])
+            start = end
+        return batches
+
+    def encode(self, model, texts: List[str], lengths: List[int]) -> np.ndarray:
+        """Encode ``texts`` (with token counts ``lengths``) batch by batch, in input order."""
+        embeddings: Optional[np.ndarray] = None
+        tokens = padded = 0
+        batches = self.plan(lengths)
+        started = time.perf_counter()
+        for batch in batches:
+            vectors = np.asarray(
+                model.encode([texts[i] for i in batch], batch_size=len(batch), show_progress_bar=False),
+                dtype=np.float32
+            )
+            if embeddings is None:
+                embeddings = np.zeros((len(texts), vectors.shape[1]), dtype=np.float32)
+            embeddings[batch] = vectors
+            tokens += sum(lengths[i] for i in batch)
+            padded += len(batch) * max(lengths[i] for i in batch)
+        seconds = time.perf_counter() - started
+
+        with self._lock:
+            for name, value in zip(self.COUNTERS, (len(texts), len(batches), tokens, padded, seconds)):
+                self._counters[name] += value
+        if texts:
+            print(
+                f"⚡ Embedded {len(texts)} chunks in {len(batches)} batches: "
+                f"{tokens / seconds if seconds else 0:,.0f} tokens/s, {self._padding(tokens, padded):.1%} padding"
+            )
+        return embeddings if embeddings is not None else np.zeros((0, 0), dtype=np.float32)
+
+    @staticmethod
+    def _padding(tokens: int, padded: int) -> float:
+        return (padded - tokens) / padded if padded else 0.0
+
+    def counters(self) -> dict:
+        with self._lock:
+            return dict(self._counters)
+
+    def throughput(self, since: Optional[dict] = None) -> dict:
+        """Throughput over everything encoded, or since an earlier ``counters()`` snapshot."""
+        now = self.counters()
+        delta = {name: now[name] - (since or {}).get(name, 0) for name in self.COUNTERS}
+        return {
+            "texts": delta["texts"],
+            "batches": delta["batches"],
+            "tokens": delta["tokens"],
+            "tokens_per_second": round(delta["tokens"] / delta["seconds"], 1) if delta["seconds"] else None,
+            "padding_ratio": round(self._padding(delta["tokens"], delta["padded_tokens"]), 3),
+        }
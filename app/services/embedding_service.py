@@ -1,70 +1,229 @@
 # app/services/embedding_service.py
-import os
-from typing import List
-from sentence_transformers import SentenceTransformer
-from pinecone import Pinecone
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+import numpy as np
 from tqdm import tqdm
 from dotenv import load_dotenv
+from app.core.config import settings
+from app.services.embedding_scheduler import EmbeddingScheduler
+from app.services.lexical_index import LexicalIndex
+from app.services.query_encoder import QueryEncoder
+from app.services.upsert_engine import UpsertEngine
+from app.services.vector_store import create_vector_store
+from app.utils.corpus_version import CorpusVersion
+from app.utils.embedding_cache import EmbeddingCache
+from app.utils.lazy_model import LazyModel
+from app.utils.model_server import model_loader
 
 load_dotenv()
 
+def load_embedding_model():
+    if settings.EMBEDDING_BACKEND == "onnx":
+        from app.utils.onnx_embedder import OnnxEmbedder
+        return OnnxEmbedder(
+            settings.EMBEDDING_MODEL, quantize=settings.EMBEDDING_ONNX_QUANTIZE, threads=settings.EMBEDDING_ONNX_THREADS
+        )
+    # sentence_transformers pulls in torch, so it is imported with the model rather than at startup
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(settings.EMBEDDING_MODEL)
+
+embedding_model = LazyModel("embedding", model_loader("embedding", load_embedding_model))
+
+def load_embedding_cache():
+    # int8 ONNX vectors differ slightly from float ones, so they are cached separately
+    quantized = settings.EMBEDDING_BACKEND == "onnx" and settings.EMBEDDING_ONNX_QUANTIZE
+    cache_name = f"{settings.EMBEDDING_MODEL}-onnx-int8" if quantized else settings.EMBEDDING_MODEL
+    return EmbeddingCache(settings.EMBEDDING_CACHE_DIR, cache_name, settings.EMBEDDING_CACHE_DTYPE)
+
+def load_lexical_index():
+    return LexicalIndex(settings.LEXICAL_INDEX_PATH)
+
 class EmbeddingService:
     def __init__(self):
-        self.api_key = os.getenv("API_KEY")
-        self.pc = Pinecone(api_key=self.api_key)
-        self.index = self.pc.Index("rag")  # Use your Pinecone index name
-        
-        # Load the embedding model once
-        self.model = SentenceTransformer("BAAI/bge-base-en-v1.5")  # Change model if needed
+        self.index = create_vector_store()  # Pinecone or the local embedded index
+        self.upsert_engine = UpsertEngine(
+            self.index,
+            max_request_bytes=settings.UPSERT_MAX_REQUEST_BYTES,
+            max_batch_vectors=settings.UPSERT_MAX_BATCH_VECTORS,
+            workers=settings.UPSERT_CONCURRENCY,
+            max_retries=settings.UPSERT_MAX_RETRIES,
+            backoff_seconds=settings.UPSERT_BACKOFF_SECONDS
+        )
+
+        # BM25 index over the same chunks, kept in step with the vector index for hybrid search.
+        # Like the local index and the embedding cache, it is served by one process when workers share it.
+        self.lexical_index = None
+        if settings.HYBRID_SEARCH_ENABLED:
+            self.lexical_index = model_loader("lexical_index", load_lexical_index)()
+
+        # Query-time model inference and blocking index calls get their own threads,
+        # so concurrent chats don't compete for Starlette's threadpool
+        self.encode_executor = ThreadPoolExecutor(settings.QUERY_ENCODE_WORKERS, thread_name_prefix="query-encode")
+        self.search_executor = ThreadPoolExecutor(settings.QUERY_SEARCH_WORKERS, thread_name_prefix="query-search")
+        self.query_encoder = QueryEncoder(
+            self._encode_queries,
+            self.encode_executor,
+            max_batch_size=settings.QUERY_ENCODE_BATCH_SIZE,
+            max_wait_ms=settings.QUERY_ENCODE_MAX_WAIT_MS,
+            cache_size=settings.QUERY_EMBEDDING_CACHE_SIZE
+        )
+
+        # Bumped on every upsert/delete so caches of query results (in every worker) can tell the corpus changed
+        self.corpus = CorpusVersion(settings.CORPUS_VERSION_PATH)
+        self.model_name = settings.EMBEDDING_MODEL
+        self.scheduler = EmbeddingScheduler(settings.EMBEDDING_BATCH_TOKENS, settings.EMBEDDING_MAX_BATCH_SIZE)
+
+        # Re-uploads and shared boilerplate chunks skip encoding entirely
+        self.cache = None
+        if settings.EMBEDDING_CACHE_ENABLED:
+            self.cache = model_loader("embedding_cache", load_embedding_cache)()
+
+    @property
+    def corpus_version(self) -> int:
+        return self.corpus.get()
+
+    @property
+    def model(self):
+        """The embedding model, loaded on first use."""
+        return embedding_model.get()
+
+    def _encode_queries(self, texts: List[str]) -> np.ndarray:
+        return self.model.encode(texts)
+
+    def _token_lengths(self, texts: List[str]) -> List[int]:
+        """Token count of each text as the model will see it (truncated to its max length)."""
+        model = self.model
+        if hasattr(model, "token_lengths"):  # OnnxEmbedder
+            return model.token_lengths(texts)
+        tokenizer = getattr(model, "tokenizer", None)
+        if tokenizer is not None:  # SentenceTransformer
+            encoded = tokenizer(texts, truncation=True, max_length=model.max_seq_length)["input_ids"]
+            return [len(ids) for ids in encoded]
+        # A model-server client has no tokenizer here; about four characters per token
+        return [len(text) // 4 + 2 for text in texts]
+
+    def _encode_chunks(self, texts: List[str]) -> np.ndarray:
+        return self.scheduler.encode(self.model, texts, self._token_lengths(texts))
 
     def embed_chunks(self, chunks: List[str]) -> List[List[float]]:
-        """Generate embeddings for a list of text chunks."""
-        embeddings = self.model.encode(chunks, show_progress_bar=True)
-        return embeddings
+        """Generate embeddings for a list of text chunks, encoding only cache misses."""
+        if self.cache is None:
+            return self._encode_chunks(chunks)
+
+        cached, missing = self.cache.get(chunks)
+        if not missing:
+            return cached
 
-    def embed_and_upsert(self, chunks: List[str], metadata: List[dict], batch_size: int = 100):
-        """Generate embeddings and upsert (upload) them in batches to Pinecone."""
+        texts = [chunks[i] for i in missing]
+        encoded = self._encode_chunks(texts)
+        self.cache.put(texts, encoded)
+        if cached is None:
+            cached = np.zeros((len(chunks), encoded.shape[1]), dtype=np.float32)
+        cached[missing] = encoded
+        return cached
+
+    def embed_and_upsert(self, chunks: List[str], metadata: List[dict], batch_size: Optional[int] = None):
+        """Generate embeddings and upsert (upload) them in batches to the vector index."""
         embeddings = self.embed_chunks(chunks)
-        total = len(embeddings)
+        self.upsert_embeddings(embeddings, metadata, batch_size=batch_size)
 
-        filename = metadata[0].get('source', 'unknown')
+    def upsert_embeddings(self, embeddings, metadata: List[dict], batch_size: Optional[int] = None,
+                          start_index: int = 0, ids: Optional[List[str]] = None, resume_from: int = 0):
+        """Upsert precomputed embeddings to the vector index through the upsert engine.
 
-        for start_idx in range(0, total, batch_size):
-            end_idx = min(start_idx + batch_size, total)
-            batch_vectors = []
+        Vectors use the given ``ids``; without them they get positional
+        ``{source}_{i}`` ids, with ``start_index`` as the chunk index of the
+        first embedding so a document can be upserted in several calls.
+        Requests are sized by payload (``batch_size`` caps vectors per
+        request), sent concurrently and retried on transient errors. If the
+        upsert still fails, ``UpsertError.acknowledged`` can be passed back as
+        ``resume_from`` to skip the vectors already stored.
+        """
+        filename = metadata[0].get('source', 'unknown')
+        vectors = [
+            (ids[i] if ids else f"{filename}_{start_index + i}", embeddings[i].tolist(), metadata[i])
+            for i in range(len(embeddings))
+        ]
 
-            for i in range(start_idx, end_idx):
-                vec_id = f"{filename}_{i}"
-                batch_vectors.append((vec_id, embeddings[i].tolist(), metadata[i]))
+        def on_batch(batch):
+            # Keep the keyword index in step with every acknowledged request
+            if self.lexical_index is not None:
+                self.lexical_index.add([vector[0] for vector in batch], [vector[2] for vector in batch])
 
-            self.index.upsert(vectors=batch_vectors)
+        try:
+            self.upsert_engine.upsert(vectors, start=resume_from, max_batch_vectors=batch_size, on_batch=on_batch)
+        finally:
+            self.corpus.bump()
 
-    def query_vectors(self, query_text: str, top_k: int = 3) -> List[dict]:
-        """Query Pinecone index and retrieve top_k matching vectors with metadata."""
-        query_emb = self.model.encode([query_text])[0]
+    def query_vectors(self, query_text: str, top_k: int = 3, filter: Optional[dict] = None) -> List[dict]:
+        """Query the vector index and retrieve top_k matching vectors with metadata."""
+        query_emb = self.query_encoder.encode_sync(query_text)
         results = self.index.query(
             vector=query_emb.tolist(),
             top_k=top_k,
-            include_metadata=True
+            include_metadata=True,
+            filter=filter
+        )
+        return [self._format_match(match) for match in results['matches']]
+
+    async def aembed_query(self, query_text: str) -> np.ndarray:
+        """Encode a query, batched with concurrent queries on the encode executor."""
+        return await self.query_encoder.encode(query_text)
+
+    async def aquery_vectors(self, query_text: str, top_k: int = 3, filter: Optional[dict] = None,
+                             query_emb: Optional[np.ndarray] = None) -> List[dict]:
+        """Async ``query_vectors``: encodes on the encode executor and searches on the search executor.
+
+        Pass ``query_emb`` to reuse an embedding the caller already computed.
+        """
+        if query_emb is None:
+            query_emb = await self.aembed_query(query_text)
+        results = await asyncio.get_running_loop().run_in_executor(
+            self.search_executor,
+            functools.partial(
+                self.index.query, vector=query_emb.tolist(), top_k=top_k, include_metadata=True, filter=filter
+            )
         )
-        matches = results['matches']
-    # Format results (you can change this as needed)
-        answers = []
-        for match in matches:
-            answer = {
-                "text": match['metadata'].get('text', ''),
-                "source": match['metadata'].get('source', ''),
-                "page": match['metadata'].get('page', None),
-                "score": match['score'],
-                "slide":match['metadata'].get("slide"),      # PPTX
-                "sheet":match['metadata'].get("sheet"),      # Excel
-                "start_row":match['metadata'].get("start_row"),  # Excel
-                "end_row":match['metadata'].get("end_row"),    # Excel
-            }
-            answers.append(answer)
-        return answers
+        return [self._format_match(match) for match in results['matches']]
+
+    def query_lexical(self, query_text: str, top_k: int = 3) -> List[dict]:
+        """Retrieve top_k chunks by BM25 keyword match (exact part numbers, codes, cell values)."""
+        if self.lexical_index is None:
+            return []
+        return [self._format_match(match) for match in self.lexical_index.search(query_text, top_k=top_k)]
+
+    async def aquery_lexical(self, query_text: str, top_k: int = 3) -> List[dict]:
+        """Async ``query_lexical`` on the search executor; scoring cost grows with posting-list length."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self.search_executor, self.query_lexical, query_text, top_k
+        )
+
+    @staticmethod
+    def _format_match(match) -> dict:
+        """Format an index match (you can change this as needed)."""
+        return {
+            "id": match['id'],
+            "text": match['metadata'].get('text', ''),
+            "source": match['metadata'].get('source', ''),
+            "page": match['metadata'].get('page', None),
+            "score": match['score'],
+            "slide":match['metadata'].get("slide"),      # PPTX
+            "sheet":match['metadata'].get("sheet"),      # Excel
+            "start_row":match['metadata'].get("start_row"),  # Excel
+            "end_row":match['metadata'].get("end_row"),    # Excel
+        }
 
     def delete_vectors(self, vector_ids: List[str]) -> None:
-        """Delete vectors from Pinecone index by their IDs."""
+        """Delete vectors from the vector index by their IDs."""
         if vector_ids:
             self.index.delete(ids=vector_ids)
+            if self.lexical_index is not None:
+                self.lexical_index.delete(vector_ids)
+            self.corpus.bump()
+
+    def shutdown(self):
+        for executor in (self.encode_executor, self.search_executor):
+            executor.shutdown(wait=False)
+        self.upsert_engine.shutdown()
@@ -0,0 +1,298 @@
+import asyncio
+import functools
+import itertools
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Iterator, List, Optional, Tuple
+from app.services.embedding_service import EmbeddingService
+from app.services.upsert_engine import UpsertError, is_transient
+
+class StageStats:
+    """Throughput counters for one pipeline stage."""
+
+    def __init__(self, name: str, workers: int):
+        self.name = name
+        self.workers = workers
+        self.batches = 0
+        self.chunks = 0
+        self.busy_seconds = 0.0
+
+    def record(self, chunks: int, seconds: float):
+        self.batches += 1
+        self.chunks += chunks
+        self.busy_seconds += seconds
+
+    def as_dict(self, wall_seconds: float) -> dict:
+        capacity = wall_seconds * self.workers
+        return {
+            "workers": self.workers,
+            "batches": self.batches,
+            "chunks": self.chunks,
+            "busy_seconds": round(self.busy_seconds, 3),
+            "chunks_per_second": round(self.chunks / self.busy_seconds, 2) if self.busy_seconds else None,
+            "utilization": round(self.busy_seconds / capacity, 3) if capacity else None,
+        }
+
+
+class IngestionPipeline:
+    """Extract → embed → upsert stages connected by bounded queues.
+
+    The loader stage pulls batches of (chunk, metadata) records from a chunk
+    generator, the embedding stage encodes them and the upsert stage writes
+    them to the vector index. Each stage runs on its own executor with its own
+    concurrency, so encoding overlaps with network upserts and with extraction
+    of the next pages. Bounded queues between stages keep memory flat when one
+    stage is slower than the others.
+    """
+
+    def __init__(self, embedding_service: EmbeddingService, batch_size: int = 100, extract_workers: int = 1,
+                 embed_workers: int = 1, upsert_workers: int = 2, queue_size: int = 4, upsert_resumes: int = 2):
+        self.embedding_service = embedding_service
+        self.batch_size = batch_size
+        self.extract_workers = max(1, extract_workers)
+        self.embed_workers = max(1, embed_workers)
+        self.upsert_workers = max(1, upsert_workers)
+        self.queue_size = queue_size
+        self.upsert_resumes = upsert_resumes
+        self.extract_executor = ThreadPoolExecutor(self.extract_workers, thread_name_prefix="ingest-extract")
+        self.embed_executor = ThreadPoolExecutor(self.embed_workers, thread_name_prefix="ingest-embed")
+        self.upsert_executor = ThreadPoolExecutor(self.upsert_workers, thread_name_prefix="ingest-upsert")
+
+    async def run(
+        self,
+        records: Iterator[Tuple[str, str, dict]],
+        on_indexed: Callable[[List[str], List[dict]], Awaitable[None]],
+        on_stage: Callable[[str], Awaitable[None]],
+        on_upsert: Optional[Callable[[List[str]], None]] = None,
+    ) -> dict:
+        """Run the three stages over ``records`` and return per-stage throughput stats.
+
+        ``records`` yields ``(vector_id, chunk, metadata)`` triples.
+        ``on_indexed(vector_ids, metadata)`` is awaited after each batch is
+        upserted and ``on_stage(name)`` when a stage has drained completely
+        ("extracted", "embedded", "indexed"). ``on_upsert(vector_ids)`` is
+        called before a batch is sent, so a failed job knows every vector a
+        partial upsert may have written.
+
+        A batch whose upsert fails on a transient error after the engine's
+        retries is resumed from its last acknowledged request, up to
+        ``upsert_resumes`` times. If the run fails, it returns only once no
+        upsert is still writing, so a rollback cannot race a stray request.
+        """
+        embed_queue = asyncio.Queue(maxsize=self.queue_size)
+        upsert_queue = asyncio.Queue(maxsize=self.queue_size)
+        stats = {
+            "extract": StageStats("extract", 1),
+            "embed": StageStats("embed", self.embed_workers),
+            "upsert": StageStats("upsert", self.upsert_workers),
+        }
+        cache = self.embedding_service.cache
+        cache_before = cache.stats() if cache else None
+        scheduler = self.embedding_service.scheduler
+        scheduler_before = scheduler.counters()
+        started = time.perf_counter()
+        upserting = set()  # upsert calls whose threads may outlive a cancelled worker
+
+        async def timed(stage: str, executor, chunks_of, func, *args, **kwargs):
+            t0 = time.perf_counter()
+            future = executor.submit(functools.partial(func, *args, **kwargs))
+            if stage == "upsert":
+                upserting.add(future)
+                future.add_done_callback(upserting.discard)
+            result = await asyncio.wrap_future(future)
+            stats[stage].record(chunks_of(result), time.perf_counter() - t0)
+            return result
+
+        async def extract_stage():
+            while True:
+                batch = await timed("extract", self.extract_executor, len, self._next_batch, records)
+                if batch:
+                    await embed_queue.put(batch)
+                if len(batch) < self.batch_size:
+                    break
+            for _ in range(self.embed_workers):
+                await embed_queue.put(None)
+            await on_stage("extracted")
+
+        async def embed_worker():
+            while (batch := await embed_queue.get()) is not None:
+                chunks = [chunk for _, chunk, _ in batch]
+                embeddings = await timed(
+                    "embed", self.embed_executor, len, self.embedding_service.embed_chunks, chunks
+                )
+                await upsert_queue.put((
+                    [vector_id for vector_id, _, _ in batch], embeddings, [meta for _, _, meta in batch]
+                ))
+
+        async def embed_stage():
+            await asyncio.gather(*(embed_worker() for _ in range(self.embed_workers)))
+            for _ in range(self.upsert_workers):
+                await upsert_queue.put(None)
+            await on_stage("embedded")
+
+        async def upsert_worker():
+            while (item := await upsert_queue.get()) is not None:
+                vector_ids, embeddings, metadata = item
+                if on_upsert is not None:
+                    on_upsert(vector_ids)
+                resume_from = 0
+                for attempt in itertools.count():
+                    try:
+                        await timed(
+                            "upsert", self.upsert_executor, lambda _: len(metadata),
+                            self.embedding_service.upsert_embeddings, embeddings, metadata,
+                            ids=vector_ids, resume_from=resume_from
+                        )
+                        break
+                    except UpsertError as e:
+                        if attempt >= self.upsert_resumes or not is_transient(e.__cause__):
+                            raise
+                        print(f"⚠️ Upsert stopped after {e.acknowledged}/{len(vector_ids)} vectors, resuming")
+                        resume_from = e.acknowledged
+                await on_indexed(vector_ids, metadata)
+
+        async def upsert_stage():
+            await asyncio.gather(*(upsert_worker() for _ in range(self.upsert_workers)))
+            await on_stage("indexed")
+
+        tasks = [asyncio.create_task(stage()) for stage in (extract_stage, embed_stage, upsert_stage)]
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        # Cancelling a worker leaves its upsert running on its thread; let it land before the caller rolls back
+        await asyncio.gather(*(asyncio.wrap_future(future) for future in list(upserting)), return_exceptions=True)
+        for task in done:
+            if task.exception() is not None:
+                raise task.exception()
+
+        report = self._report(stats, time.perf_counter() - started)
+        report["embedding_throughput"] = scheduler.throughput(scheduler_before)
+        if cache:
+            cache_after = cache.stats()
+            hits, misses = cache_after["hits"] - cache_before["hits"], cache_after["misses"] - cache_before["misses"]
+            # Counters are shared, so concurrent jobs can blur the per-document split
+            report["embedding_cache"] = {
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 3) if hits + misses else None,
+            }
+            print(f"♻️ Embedding cache: {hits}/{hits + misses} chunks reused")
+        return report
+
+    def _next_batch(self, records) -> list:
+        return list(itertools.islice(records, self.batch_size))
+
+    @staticmethod
+    def _report(stats: dict, wall_seconds: float) -> dict:
+        report = {name: stage.as_dict(wall_seconds) for name, stage in stats.items()}
+        # The stage with the highest utilisation is the one holding the others back
+        report["bottleneck"] = max(stats, key=lambda name: report[name]["utilization"] or 0)
+        report["wall_seconds"] = round(wall_seconds, 3)
+        return report
+
+    def shutdown(self):
+        for executor in (self.extract_executor, self.embed_executor, self.upsert_executor):
+            executor.shutdown(wait=False)
+
+
+if __name__ == "__main__":
+    # Stand-in check for retries, resume and rollback: a LocalVectorStore whose requests fail
+    # like a rate-limited hosted index, written to through the real UpsertEngine
+    import os
+    import tempfile
+    import threading
+    import numpy as np
+    from app.services.embedding_scheduler import EmbeddingScheduler
+    from app.services.local_vector_store import LocalVectorStore
+    from app.services.upsert_engine import UpsertEngine
+
+    class StatusError(Exception):
+        def __init__(self, status: int):
+            super().__init__(f"HTTP {status}")
+            self.status = status
+
+    class FailingStore(LocalVectorStore):
+        """Rate limits every ``every``-th request; a request carrying ``poison`` fails permanently."""
+
+        def __init__(self, directory: str, every: int, poison: Optional[str] = None):
+            super().__init__(directory)
+            self.every = every
+            self.poison = poison
+            self.requests = 0
+            self._requests_lock = threading.Lock()
+
+        def upsert(self, vectors):
+            with self._requests_lock:
+                self.requests += 1
+                request = self.requests
+            if any(vector_id == self.poison for vector_id, _, _ in vectors):
+                raise StatusError(400)
+            if request % self.every == 0:
+                raise StatusError(429)
+            super().upsert(vectors)
+
+    class StandInService:
+        """The parts of EmbeddingService the pipeline uses, without a model."""
+
+        cache = None
+
+        def __init__(self, index: LocalVectorStore, max_retries: int):
+            self.scheduler = EmbeddingScheduler()
+            self.upsert_engine = UpsertEngine(index, max_batch_vectors=10, max_retries=max_retries)
+            self.upsert_engine._sleep = lambda seconds: None
+
+        def embed_chunks(self, chunks):
+            return np.random.default_rng(len(chunks)).standard_normal((len(chunks), 8)).astype(np.float32)
+
+        def upsert_embeddings(self, embeddings, metadata, ids=None, resume_from=0):
+            vectors = [(ids[i], embeddings[i].tolist(), metadata[i]) for i in range(len(ids))]
+            self.upsert_engine.upsert(vectors, start=resume_from)
+
+    async def ingest(store: FailingStore, max_retries: int):
+        service = StandInService(store, max_retries)
+        pipeline = IngestionPipeline(service, batch_size=50, upsert_workers=2, upsert_resumes=10)
+        records = ((f"v{i}", f"chunk {i}", {"text": f"chunk {i}"}) for i in range(200))
+        indexed, attempted = [], []
+
+        async def on_indexed(vector_ids, metadata):
+            indexed.extend(vector_ids)
+
+        async def on_stage(stage):
+            pass
+
+        try:
+            await pipeline.run(records, on_indexed, on_stage, on_upsert=attempted.extend)
+            error = None
+        except UpsertError as e:
+            error = e
+        finally:
+            pipeline.shutdown()
+            service.upsert_engine.shutdown()
+        return service.upsert_engine.retries, indexed, attempted, error
+
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        # Every third request is rate limited: the engine's retry absorbs it
+        store = FailingStore(os.path.join(tmp, "retried"), every=3)
+        retries, indexed, _, error = asyncio.run(ingest(store, max_retries=1))
+        if error or not retries or len(indexed) != 200 or store.stats()["vectors"] != 200:
+            failures.append(f"retried: {retries} retries, {len(indexed)} indexed, error {error}")
+
+        # Without engine retries, the pipeline resumes batches from their acknowledged prefix
+        store = FailingStore(os.path.join(tmp, "resumed"), every=3)
+        _, indexed, _, error = asyncio.run(ingest(store, max_retries=0))
+        if error or sorted(indexed) != sorted(f"v{i}" for i in range(200)) or store.stats()["vectors"] != 200:
+            failures.append(f"resumed: {len(indexed)} indexed, {store.stats()['vectors']} stored, error {error}")
+
+        # A permanent error fails the run; deleting every attempted id must leave nothing behind
+        store = FailingStore(os.path.join(tmp, "rolled_back"), every=5, poison="v120")
+        _, indexed, attempted, error = asyncio.run(ingest(store, max_retries=0))
+        stored = store.stats()["vectors"]
+        store.delete(ids=attempted)
+        if error is None or not stored or store.stats()["vectors"]:
+            failures.append(f"rolled back: {stored} stored, {store.stats()['vectors']} left, error {error}")
+
+    if failures:
+        raise SystemExit("❌ Upsert resume/rollback check failed: " + "; ".join(failures))
+    print("✅ Upserts retry, resume from the acknowledged prefix and roll back cleanly")
@@ -0,0 +1,55 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, List, Optional
+
+class IngestionQueue:
+    """Bounded background queue that runs ingestion jobs on a fixed pool of workers."""
+
+    def __init__(self, handler: Callable[[Any], Awaitable[None]], workers: int = 1, max_size: int = 100):
+        self.handler = handler
+        self.workers = max(1, workers)
+        self.max_size = max_size
+        # Blocking work (conversion, OCR, encoding, upserts) runs here, off the event loop
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ingest")
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+
+    def _ensure_started(self):
+        """Start the worker tasks on the running event loop the first time a job arrives."""
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_size)
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def submit(self, job: Any) -> None:
+        """Enqueue a job. Raises asyncio.QueueFull when the queue is at capacity."""
+        self._ensure_started()
+        self._queue.put_nowait(job)
+
+    def pending(self) -> int:
+        """Number of jobs waiting for a worker."""
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def run_blocking(self, func: Callable, *args, **kwargs):
+        """Run a blocking callable on the ingestion executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self.handler(job)
+            except Exception as e:
+                print(f"❌ Ingestion job failed: {e}")
+            finally:
+                self._queue.task_done()
+
+    async def shutdown(self):
+        """Cancel the workers and release the executor."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+        self.executor.shutdown(wait=False)
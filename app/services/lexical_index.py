@@ -0,0 +1,209 @@
+import json
+import math
+import os
+import re
+import sqlite3
+import tempfile
+import threading
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+import numpy as np
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:[-_./:][a-z0-9]+)*")
+SEPARATOR_RE = re.compile(r"[-_./:]")
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased word tokens; codes like ``AB-1234`` are indexed whole and by their parts."""
+    tokens = []
+    for match in TOKEN_RE.finditer(text.lower()):
+        token = match.group()
+        tokens.append(token)
+        if not token.isalnum():
+            tokens.extend(part for part in SEPARATOR_RE.split(token) if part)
+    return tokens
+
+
+class LexicalIndex:
+    """BM25 inverted index over chunk text, updated as chunks are upserted.
+
+    Chunk metadata (including the text) is persisted in SQLite and the posting
+    lists are rebuilt from it on a background thread at startup; calls wait
+    for that rebuild instead of blocking construction. Postings are held as compact numpy
+    arrays of document numbers and term frequencies, so scoring a term is a
+    couple of vectorised operations. New chunks are appended to small pending
+    lists that are merged into a term's arrays the first time it is queried.
+    Deleted chunks are masked out and purged once they make up a quarter of
+    the index; their document numbers are never reused, since unpurged
+    postings still point at them.
+    """
+
+    def __init__(self, path: str, k1: float = 1.2, b: float = 0.75):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks (doc INTEGER PRIMARY KEY, id TEXT UNIQUE NOT NULL, metadata TEXT NOT NULL)"
+        )
+        self._conn.commit()
+
+        self._docs: Dict[str, int] = {}  # chunk id -> document number
+        self._ids: List[Optional[str]] = []
+        self._next_doc = 0
+        self._lengths = np.zeros(0, dtype=np.float32)
+        self._live = np.zeros(0, dtype=bool)
+        self._total_length = 0
+        self._dead = 0
+        self._postings: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self._pending: Dict[str, Tuple[List[int], List[int]]] = {}
+        self._loaded = threading.Event()
+        threading.Thread(target=self._load, name="lexical-index-load", daemon=True).start()
+
+    def _load(self):
+        try:
+            with self._lock:
+                self._load_chunks()
+        finally:
+            self._loaded.set()
+
+    def _load_chunks(self):
+        for doc, chunk_id, metadata in self._conn.execute("SELECT doc, id, metadata FROM chunks ORDER BY doc"):
+            self._index(doc, chunk_id, json.loads(metadata).get("text", ""))
+        print(f"🔤 Lexical index loaded: {len(self._docs)} chunks, {len(self._pending)} terms")
+
+    def _index(self, doc: int, chunk_id: str, text: str):
+        if doc >= len(self._ids):
+            grow = max(doc + 1 - len(self._ids), len(self._ids), 1024)
+            self._ids.extend([None] * grow)
+            self._lengths = np.concatenate([self._lengths, np.zeros(grow, dtype=np.float32)])
+            self._live = np.concatenate([self._live, np.zeros(grow, dtype=bool)])
+
+        tokens = tokenize(text)
+        for term, tf in Counter(tokens).items():
+            docs, tfs = self._pending.setdefault(term, ([], []))
+            docs.append(doc)
+            tfs.append(tf)
+        self._docs[chunk_id] = doc
+        self._next_doc = max(self._next_doc, doc + 1)
+        self._ids[doc] = chunk_id
+        self._lengths[doc] = len(tokens)
+        self._live[doc] = True
+        self._total_length += len(tokens)
+
+    def add(self, ids: List[str], metadata: List[dict]):
+        """Index chunks by id; ``metadata["text"]`` is tokenized and the metadata returned by ``search``."""
+        self._loaded.wait()
+        with self._lock:
+            self._remove([chunk_id for chunk_id in ids if chunk_id in self._docs])
+            for chunk_id, meta in zip(ids, metadata):
+                # Numbered explicitly: SQLite would hand a deleted max rowid out again
+                doc = self._next_doc
+                self._conn.execute(
+                    "INSERT INTO chunks (doc, id, metadata) VALUES (?, ?, ?)", (doc, chunk_id, json.dumps(meta))
+                )
+                self._index(doc, chunk_id, meta.get("text", ""))
+            self._conn.commit()
+
+    def delete(self, ids: List[str]):
+        self._loaded.wait()
+        with self._lock:
+            self._remove(ids)
+            self._conn.commit()
+
+    def _remove(self, ids: List[str]):
+        removed = []
+        for chunk_id in ids:
+            doc = self._docs.pop(chunk_id, None)
+            if doc is None:
+                continue
+            self._live[doc] = False
+            self._ids[doc] = None
+            self._total_length -= int(self._lengths[doc])
+            self._dead += 1
+            removed.append((chunk_id,))
+        self._conn.executemany("DELETE FROM chunks WHERE id = ?", removed)
+        if self._dead > max(1000, len(self._docs) // 4):
+            self._purge()
+
+    def _purge(self):
+        """Drop deleted documents from every posting list."""
+        for term in list(self._pending):
+            self._merge(term)
+        for term, (docs, tfs) in list(self._postings.items()):
+            keep = self._live[docs]
+            if keep.all():
+                continue
+            if keep.any():
+                self._postings[term] = (docs[keep], tfs[keep])
+            else:
+                del self._postings[term]
+        self._dead = 0
+
+    def _merge(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        pending = self._pending.pop(term, None)
+        postings = self._postings.get(term)
+        if pending is not None:
+            docs = np.asarray(pending[0], dtype=np.int32)
+            tfs = np.asarray(pending[1], dtype=np.float32)
+            if postings is not None:
+                docs = np.concatenate([postings[0], docs])
+                tfs = np.concatenate([postings[1], tfs])
+            postings = self._postings[term] = (docs, tfs)
+        return postings
+
+    def search(self, query: str, top_k: int = 10) -> List[dict]:
+        """Return up to ``top_k`` ``{"id", "score", "metadata"}`` matches ranked by BM25."""
+        terms = set(tokenize(query))
+        self._loaded.wait()
+        with self._lock:
+            n = len(self._docs)
+            if not n or not terms:
+                return []
+
+            avg_length = self._total_length / n or 1.0
+            scores = np.zeros(len(self._ids), dtype=np.float32)
+            for term in terms:
+                postings = self._merge(term)
+                if postings is None:
+                    continue
+                docs, tfs = postings
+                df = int(self._live[docs].sum())
+                if not df:
+                    continue
+                idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1 - self.b + self.b * self._lengths[docs] / avg_length)
+                scores[docs] += idf * tfs * (self.k1 + 1) / (tfs + norm)
+
+            scores[~self._live] = 0
+            hits = np.flatnonzero(scores)
+            if not len(hits):
+                return []
+            k = min(top_k, len(hits))
+            top = hits[np.argpartition(-scores[hits], k - 1)[:k]]
+            top = top[np.argsort(-scores[top])]
+
+            placeholders = ",".join("?" * len(top))
+            metadata = dict(self._conn.execute(
+                f"SELECT doc, metadata FROM chunks WHERE doc IN ({placeholders})", [int(doc) for doc in top]
+            ))
+            return [
+                {"id": self._ids[doc], "score": float(scores[doc]), "metadata": json.loads(metadata[int(doc)])}
+                for doc in top
+            ]
+
+
+if __name__ == "__main__":
+    # Regression check: a chunk added after a delete must not inherit the deleted chunk's postings
+    with tempfile.TemporaryDirectory() as tmp:
+        index = LexicalIndex(os.path.join(tmp, "lexical.sqlite3"))
+        index.add(["a", "b"], [{"text": "pump maintenance manual"}, {"text": "sensor AB-1234 calibration"}])
+        index.delete(["b"])
+        index.add(["c"], [{"text": "valve inspection"}])
+        stale = [hit["id"] for query in ("AB-1234", "sensor") for hit in index.search(query)]
+        fresh = [hit["id"] for hit in index.search("valve")]
+        index._conn.close()
+    if stale or fresh != ["c"]:
+        raise SystemExit(f"❌ Deleted postings leaked into new chunks: {stale}, valve -> {fresh}")
+    print("✅ Deleted chunks stay out of search results after new adds")
@@ -0,0 +1,389 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import List, Optional
+import numpy as np
+from app.services.vector_store import VectorStore
+from app.utils.quantization import METHODS, approximate_scores, binarize, code_width, quantize_int8
+
+TEXT_FIELD = "text"
+
+_OPERATORS = {
+    "$eq": lambda value, operand: value == operand,
+    "$ne": lambda value, operand: value != operand,
+    "$in": lambda value, operand: value in operand,
+    "$nin": lambda value, operand: value not in operand,
+    "$gt": lambda value, operand: value is not None and value > operand,
+    "$gte": lambda value, operand: value is not None and value >= operand,
+    "$lt": lambda value, operand: value is not None and value < operand,
+    "$lte": lambda value, operand: value is not None and value <= operand,
+}
+
+def matches_filter(metadata: dict, filter: dict) -> bool:
+    """Evaluate a Pinecone-style metadata filter (``$eq``, ``$in``, ``$and``, ...)."""
+    for key, condition in filter.items():
+        if key == "$and":
+            if not all(matches_filter(metadata, sub) for sub in condition):
+                return False
+        elif key == "$or":
+            if not any(matches_filter(metadata, sub) for sub in condition):
+                return False
+        else:
+            if not isinstance(condition, dict):
+                condition = {"$eq": condition}
+            value = metadata.get(key)
+            for op, operand in condition.items():
+                if op not in _OPERATORS:
+                    raise ValueError(f"Unsupported filter operator: {op}")
+                if not _OPERATORS[op](value, operand):
+                    return False
+    return True
+
+
+class LocalVectorStore(VectorStore):
+    """Embedded vector index for offline deployments.
+
+    Vectors are L2-normalised (scores are cosine similarities) and kept in a
+    memory-mapped ``vectors.f32`` matrix; ids, metadata and inverted-list
+    assignments live in ``index.sqlite3``. Below ``ivf_threshold`` vectors a
+    query scores every row. Above it an IVF coarse quantizer is trained with
+    spherical k-means and a query only scores rows in the ``nprobe`` closest
+    lists. Chunk text is kept on disk and only read for returned matches.
+
+    With ``quantization`` set to "int8" or "binary", candidates are first
+    scored against compact codes (``vectors.codes``) and only the best
+    ``rescore_factor * top_k`` are rescored with the float vectors, so the
+    float matrix is read a few rows per query instead of being scanned.
+    Codes are taken relative to the mean stored vector (embeddings are not
+    zero-centred, so raw sign bits would be nearly constant); the mean is
+    re-estimated and the codes rebuilt whenever the index has grown
+    ``RETRAIN_GROWTH`` times.
+    """
+
+    GROW_ROWS = 4096
+    KMEANS_ITERATIONS = 10
+    RETRAIN_GROWTH = 4  # retrain once the index is this many times larger than at training
+
+    def __init__(self, directory: str, nprobe: int = 8, ivf_threshold: int = 20000,
+                 quantization: str = "none", rescore_factor: int = 40):
+        if quantization not in METHODS:
+            raise ValueError(f"Unknown quantization: {quantization}")
+        os.makedirs(directory, exist_ok=True)
+        self.vectors_path = os.path.join(directory, "vectors.f32")
+        self.codes_path = os.path.join(directory, "vectors.codes")
+        self.scales_path = os.path.join(directory, "scales.f32")
+        self.centroids_path = os.path.join(directory, "centroids.npy")
+        self.center_path = os.path.join(directory, "center.npy")
+        self.nprobe = nprobe
+        self.ivf_threshold = ivf_threshold
+        self.quantization = quantization
+        self.rescore_factor = rescore_factor
+        self.dim: Optional[int] = None
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS vectors ("
+            "id TEXT PRIMARY KEY, row INTEGER NOT NULL, list_id INTEGER NOT NULL, metadata TEXT NOT NULL, text TEXT)"
+        )
+        self._conn.execute("CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._conn.commit()
+
+        self._matrix = None
+        self._codes = None
+        self._scales = None  # per-row int8 scale
+        self._center = None  # mean vector subtracted before quantizing
+        self._centered_size = 0
+        self._capacity = 0
+        self._ids = {}  # id -> row
+        self._row_ids: List[Optional[str]] = []
+        self._metadata: List[Optional[dict]] = []  # per row, without the chunk text
+        self._lists = np.zeros(0, dtype=np.int32)
+        self._live = np.zeros(0, dtype=bool)
+        self._free: List[int] = []
+        self._next_row = 0
+        self._centroids = None
+        self._trained_size = 0
+        self._load()
+
+    def _load(self):
+        info = dict(self._conn.execute("SELECT key, value FROM info"))
+        if "dim" not in info:
+            return
+        self.dim = int(info["dim"])
+        self._trained_size = int(info.get("trained_size", 0))
+        if os.path.exists(self.centroids_path):
+            self._centroids = np.load(self.centroids_path)
+
+        self._capacity = os.path.getsize(self.vectors_path) // (self.dim * 4) if os.path.exists(self.vectors_path) else 0
+        if self._capacity:
+            self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(self._capacity, self.dim))
+        self._resize_rows(self._capacity)
+        if self.quantization != "none" and self._capacity:
+            valid = info.get("quantization") == self.quantization and os.path.exists(self.center_path)
+            if valid:
+                self._center = np.load(self.center_path)
+                self._centered_size = int(info.get("centered_size", 0))
+            self._map_codes(self._capacity)
+
+        next_row = 0
+        for vector_id, row, list_id, metadata in self._conn.execute("SELECT id, row, list_id, metadata FROM vectors"):
+            self._ids[vector_id] = row
+            self._row_ids[row] = vector_id
+            self._metadata[row] = json.loads(metadata)
+            self._lists[row] = list_id
+            self._live[row] = True
+            next_row = max(next_row, row + 1)
+        self._free = [row for row in range(next_row) if not self._live[row]]
+        self._next_row = next_row
+        if self.quantization != "none" and self._capacity and not valid:
+            self._rebuild_codes()
+
+    def _map_codes(self, capacity: int):
+        """Grow and map the code (and int8 scale) files to ``capacity`` rows."""
+        width = code_width(self.quantization, self.dim)
+        dtype = np.int8 if self.quantization == "int8" else np.uint8
+        self._codes = self._map_file(self.codes_path, dtype, (capacity, width), self._codes)
+        if self.quantization == "int8":
+            self._scales = self._map_file(self.scales_path, np.float32, (capacity,), self._scales)
+
+    @staticmethod
+    def _map_file(path: str, dtype, shape, current):
+        if current is not None:
+            current.flush()
+        size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+        if not os.path.exists(path) or os.path.getsize(path) < size:
+            with open(path, "ab") as f:
+                f.truncate(size)
+        return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+    def _write_codes(self, rows, values: np.ndarray):
+        values = values - self._center
+        if self.quantization == "int8":
+            self._codes[rows], self._scales[rows] = quantize_int8(values)
+        else:
+            self._codes[rows] = binarize(values)
+
+    def _rebuild_codes(self):
+        """Re-estimate the mean vector and re-encode every stored vector."""
+        live = np.flatnonzero(self._live[:self._next_row])
+        sample = np.sort(np.random.default_rng(0).choice(live, min(len(live), 65536), replace=False))
+        self._center = np.asarray(self._matrix[sample]).mean(axis=0) if len(sample) else np.zeros(self.dim, np.float32)
+        self._centered_size = len(live)
+        np.save(self.center_path, self._center)
+        for start in range(0, self._next_row, 65536):
+            rows = np.arange(start, min(start + 65536, self._next_row))
+            self._write_codes(rows, np.asarray(self._matrix[rows]))
+        self._codes.flush()
+        if self._scales is not None:
+            self._scales.flush()
+        self._conn.executemany("INSERT OR REPLACE INTO info VALUES (?, ?)", [
+            ("quantization", self.quantization), ("centered_size", str(self._centered_size))
+        ])
+        self._conn.commit()
+        print(f"🗜️ Built {self.quantization} codes for {self._next_row} local index rows")
+
+    def _resize_rows(self, capacity: int):
+        grow = capacity - len(self._row_ids)
+        if grow <= 0:
+            return
+        self._row_ids.extend([None] * grow)
+        self._metadata.extend([None] * grow)
+        self._lists = np.concatenate([self._lists, np.zeros(grow, dtype=np.int32)])
+        self._live = np.concatenate([self._live, np.zeros(grow, dtype=bool)])
+
+    def _ensure_capacity(self, rows: int):
+        if rows <= self._capacity:
+            return
+        new_capacity = max(rows, self._capacity * 2, self.GROW_ROWS)
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(new_capacity * self.dim * 4)
+        self._matrix = np.memmap(self.vectors_path, dtype=np.float32, mode="r+", shape=(new_capacity, self.dim))
+        if self.quantization != "none":
+            self._map_codes(new_capacity)
+        self._capacity = new_capacity
+        self._resize_rows(new_capacity)
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        return vectors / np.maximum(norms, 1e-12)
+
+    def upsert(self, vectors):
+        if not vectors:
+            return
+        values = self._normalize(np.asarray([vector[1] for vector in vectors], dtype=np.float32))
+        with self._lock:
+            if self.dim is None:
+                self.dim = values.shape[1]
+                self._conn.execute("INSERT OR REPLACE INTO info VALUES ('dim', ?)", (str(self.dim),))
+            elif values.shape[1] != self.dim:
+                raise ValueError(f"Vector dimension {values.shape[1]} does not match index dimension {self.dim}")
+
+            rows = []
+            for vector_id, _, _ in vectors:
+                row = self._ids.get(vector_id)
+                if row is None:
+                    row = self._free.pop() if self._free else self._next_row
+                    self._next_row = max(self._next_row, row + 1)
+                    self._ids[vector_id] = row
+                rows.append(row)
+
+            self._ensure_capacity(self._next_row)
+            self._matrix[rows] = values
+            self._matrix.flush()
+            list_ids = self._assign(values) if self._centroids is not None else np.zeros(len(rows), dtype=np.int32)
+
+            records = []
+            for (vector_id, _, metadata), row, list_id in zip(vectors, rows, list_ids):
+                metadata = dict(metadata or {})
+                text = metadata.pop(TEXT_FIELD, None)
+                self._row_ids[row] = vector_id
+                self._metadata[row] = metadata
+                self._lists[row] = list_id
+                self._live[row] = True
+                records.append((vector_id, row, int(list_id), json.dumps(metadata), text))
+            self._conn.executemany("INSERT OR REPLACE INTO vectors VALUES (?, ?, ?, ?, ?)", records)
+            self._conn.commit()
+
+            if self.quantization != "none" and len(self._ids) > self._centered_size * self.RETRAIN_GROWTH:
+                self._rebuild_codes()
+            elif self.quantization != "none":
+                self._write_codes(rows, values)
+                self._codes.flush()
+                if self._scales is not None:
+                    self._scales.flush()
+
+            if len(self._ids) >= self.ivf_threshold and (
+                self._centroids is None or len(self._ids) > self._trained_size * self.RETRAIN_GROWTH
+            ):
+                self._train()
+
+    def delete(self, ids):
+        with self._lock:
+            removed = []
+            for vector_id in ids:
+                row = self._ids.pop(vector_id, None)
+                if row is None:
+                    continue
+                self._row_ids[row] = None
+                self._metadata[row] = None
+                self._live[row] = False
+                self._free.append(row)
+                removed.append((vector_id,))
+            self._conn.executemany("DELETE FROM vectors WHERE id = ?", removed)
+            self._conn.commit()
+
+    def query(self, vector, top_k=3, include_metadata=True, filter=None):
+        query = self._normalize(np.asarray(vector, dtype=np.float32))
+        with self._lock:
+            if not self._ids:
+                return {"matches": []}
+
+            n = self._next_row
+            full_scan = True
+            if self._centroids is not None and len(self._ids) >= self.ivf_threshold:
+                probes = np.argsort(self._centroids @ query)[::-1][:self.nprobe]
+                rows = self._candidates(np.isin(self._lists[:n], probes), filter)
+                # Too few hits in the probed lists (typically a selective filter) falls back to a full scan
+                full_scan = len(rows) < top_k
+            if full_scan:
+                rows = self._candidates(None, filter)
+            if not len(rows):
+                return {"matches": []}
+
+            if self.quantization != "none":
+                rows, scores = self._rescore(rows, query, top_k)
+            elif full_scan:
+                # A full scan multiplies the contiguous mapped matrix rather than gathering rows
+                scores = (self._matrix[:n] @ query)[rows]
+            else:
+                scores = self._matrix[rows] @ query
+            k = min(top_k, len(rows))
+            top = np.argpartition(-scores, k - 1)[:k]
+            top = top[np.argsort(-scores[top])]
+            matches = [
+                {"id": self._row_ids[rows[i]], "score": float(scores[i]), "metadata": dict(self._metadata[rows[i]])}
+                for i in top
+            ]
+
+            if include_metadata:
+                placeholders = ",".join("?" * len(matches))
+                texts = dict(self._conn.execute(
+                    f"SELECT id, text FROM vectors WHERE id IN ({placeholders})", [match["id"] for match in matches]
+                ))
+                for match in matches:
+                    if texts.get(match["id"]) is not None:
+                        match["metadata"][TEXT_FIELD] = texts[match["id"]]
+            else:
+                for match in matches:
+                    match.pop("metadata")
+        return {"matches": matches}
+
+    def _rescore(self, rows: np.ndarray, query: np.ndarray, top_k: int):
+        """Shortlist ``rows`` by their codes, then score the shortlist with the float vectors."""
+        shortlist = min(len(rows), top_k * self.rescore_factor)
+        if shortlist < len(rows):
+            approximate = approximate_scores(self.quantization, self._codes, self._scales, rows, query - self._center)
+            # Sorted rows read the mapped float file front to back
+            rows = np.sort(rows[np.argpartition(-approximate, shortlist - 1)[:shortlist]])
+        return rows, self._matrix[rows] @ query
+
+    def stats(self) -> dict:
+        """Bytes per vector scanned at query time and the float bytes kept on disk."""
+        width = self.dim or 0
+        scanned = width * 4 if self.quantization == "none" else code_width(self.quantization, width) + (
+            4 if self.quantization == "int8" else 0
+        )
+        return {
+            "vectors": len(self._ids),
+            "quantization": self.quantization,
+            "scanned_bytes_per_vector": scanned,
+            "compression": round(width * 4 / scanned, 1) if scanned else None,
+        }
+
+    def _candidates(self, mask: Optional[np.ndarray], filter: Optional[dict]) -> np.ndarray:
+        live = self._live[:self._next_row]
+        rows = np.flatnonzero(live if mask is None else live & mask)
+        if filter:
+            rows = np.array([row for row in rows if matches_filter(self._metadata[row], filter)], dtype=np.int64)
+        return rows
+
+    def _assign(self, values: np.ndarray) -> np.ndarray:
+        return np.argmax(values @ self._centroids.T, axis=1).astype(np.int32)
+
+    def _train(self):
+        """Train IVF centroids on a sample of live vectors and reassign every row."""
+        rows = np.flatnonzero(self._live[:self._next_row])
+        nlist = int(min(4096, max(16, np.sqrt(len(rows)))))
+        rng = np.random.default_rng(0)
+        sample = np.sort(rng.choice(rows, min(len(rows), nlist * 64), replace=False))
+        data = np.asarray(self._matrix[sample])
+        nlist = min(nlist, len(data))  # a low LOCAL_INDEX_IVF_THRESHOLD can leave fewer rows than lists
+
+        centroids = data[rng.choice(len(data), nlist, replace=False)]
+        for _ in range(self.KMEANS_ITERATIONS):
+            assignment = np.argmax(data @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignment, data)
+            counts = np.bincount(assignment, minlength=nlist)
+            # Empty lists keep their previous centroid
+            centroids = np.where(counts[:, None] > 0, self._normalize(sums), centroids)
+        self._centroids = centroids.astype(np.float32)
+
+        for start in range(0, len(rows), 65536):
+            block = rows[start:start + 65536]
+            self._lists[block] = self._assign(np.asarray(self._matrix[block]))
+
+        np.save(self.centroids_path, self._centroids)
+        self._trained_size = len(rows)
+        self._conn.executemany(
+            "UPDATE vectors SET list_id = ? WHERE id = ?", [(int(self._lists[row]), self._row_ids[row]) for row in rows]
+        )
+        self._conn.execute("INSERT OR REPLACE INTO info VALUES ('trained_size', ?)", (str(self._trained_size),))
+        self._conn.commit()
+        print(f"🧭 Trained local IVF index: {nlist} lists over {len(rows)} vectors")
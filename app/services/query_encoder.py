@@ -0,0 +1,112 @@
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor
+from typing import Callable, List
+import numpy as np
+
+class QueryEncoder:
+    """Query embedding with an LRU cache and micro-batching.
+
+    Concurrent ``encode`` calls that arrive within ``max_wait_ms`` of the
+    first one (or until ``max_batch_size`` are waiting) are passed to ``encode``
+    as one batch on ``executor``, and each caller awaits its own
+    future. Identical queries in flight share a future, and recent results
+    are served from the cache without touching the model.
+    """
+
+    def __init__(self, encode: Callable[[List[str]], np.ndarray], executor: Executor, max_batch_size: int = 32, max_wait_ms: float = 5.0,
+                 cache_size: int = 1024):
+        self._encode = encode
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.cache_size = cache_size
+        self.batches = 0
+        self.encoded = 0
+        self.cache_hits = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()  # the cache is shared with the sync path
+        self._pending = {}  # query -> future, for the batch being collected
+        self._timer = None
+        self._tasks = set()
+
+    @staticmethod
+    def _key(text: str) -> str:
+        return " ".join(text.split())
+
+    def _cached(self, key: str):
+        with self._lock:
+            vector = self._cache.get(key)
+            if vector is not None:
+                self._cache.move_to_end(key)
+                self.cache_hits += 1
+            return vector
+
+    def _store(self, keys, vectors):
+        with self._lock:
+            for key, vector in zip(keys, vectors):
+                self._cache[key] = vector
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    async def encode(self, text: str) -> np.ndarray:
+        key = self._key(text)
+        vector = self._cached(key)
+        if vector is not None:
+            return vector
+
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._pending[key] = loop.create_future()
+            if len(self._pending) >= self.max_batch_size:
+                self._flush()
+            elif self._timer is None:
+                self._timer = loop.call_later(self.max_wait, self._flush)
+        # A cancelled request must not cancel a future other callers share
+        return await asyncio.shield(future)
+
+    def encode_sync(self, text: str) -> np.ndarray:
+        """Cached single-query encode for callers outside the event loop."""
+        key = self._key(text)
+        vector = self._cached(key)
+        if vector is None:
+            vector = self._encode([text])[0]
+            self._store([key], [vector])
+        return vector
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, {}
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: dict):
+        keys = list(batch)
+        try:
+            vectors = await asyncio.get_running_loop().run_in_executor(self.executor, self._encode, keys)
+        except Exception as e:
+            for future in batch.values():
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        self._store(keys, vectors)
+        self.batches += 1
+        self.encoded += len(keys)
+        for key, vector in zip(keys, vectors):
+            if not batch[key].done():
+                batch[key].set_result(vector)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "queries_encoded": self.encoded,
+            "mean_batch_size": round(self.encoded / self.batches, 2) if self.batches else None,
+            "cache_hits": self.cache_hits,
+        }
@@ -1,47 +1,183 @@
-from typing import List
+import asyncio
+import json
+from typing import AsyncIterator, Callable, List, Optional, Tuple
+import numpy as np
 from fastapi import HTTPException
+from app.core.config import settings
 from app.models.schemas import QueryRequest, QueryResponse, AnswerChunk
+from app.services.answer_cache import AnswerCache
 from app.services.embedding_service import EmbeddingService
-from app.utils.mistral_client import build_prompt, query_mistral_local
+from app.services.rerank_service import RerankService
+from app.utils.mistral_client import build_prompt, aquery_mistral_local, astream_mistral_local
+
+def reciprocal_rank_fusion(result_lists: List[List[dict]], k: int = 60) -> List[dict]:
+    """Merge ranked result lists by summing 1 / (k + rank) per chunk id.
+
+    The fused score replaces each chunk's retriever score, since BM25 and
+    cosine scores are not comparable.
+    """
+    fused = {}
+    for results in result_lists:
+        for rank, chunk in enumerate(results, start=1):
+            entry = fused.setdefault(chunk["id"], dict(chunk, score=0.0))
+            entry["score"] += 1.0 / (k + rank)
+    return sorted(fused.values(), key=lambda chunk: chunk["score"], reverse=True)
+
+def _sse(event: str, data) -> str:
+    """Encode one Server-Sent Events message."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
 
 class QueryService:
     """Service for handling document queries and generating responses."""
     
-    def __init__(self, embedding_service: EmbeddingService):
+    def __init__(self, embedding_service: EmbeddingService, rerank_service: Optional[RerankService] = None,
+                 answer_cache: Optional[AnswerCache] = None):
         self.embedding_service = embedding_service
+        self.rerank_service = rerank_service
+        self.answer_cache = answer_cache
     
-    def process_query(self, req: QueryRequest) -> QueryResponse:
+    async def process_query(self, req: QueryRequest) -> QueryResponse:
         """Process user query and return AI-generated response with references."""
         try:
-            # Get relevant chunks from Pinecone
-            top_chunks = self.embedding_service.query_vectors(req.question, top_k=req.top_k)
+            # Repeated and near-duplicate questions are answered from the cache
+            version = self.embedding_service.corpus_version
+            cached, query_emb = await self._cached_answer(req, version)
+            if cached is not None:
+                return cached
+
+            # Get relevant chunks from the vector and keyword indexes
+            top_chunks = await self.retrieve(req.question, req.top_k, query_emb)
             
             if not top_chunks:
                 raise HTTPException(status_code=404, detail="No relevant documents found.")
             
             # Build prompt and query Mistral
-            prompt = build_prompt(top_chunks, req.question)
-            answer = query_mistral_local(prompt)
+            prompt = await self._build_prompt(top_chunks, req.question)
+            answer = await aquery_mistral_local(prompt)
             
-            # Format references for response
-            references = []
-            for chunk in top_chunks:
-                references.append(
-                    AnswerChunk(
-                        text=chunk.get("text", ""),
-                        source=chunk.get("source", "N/A"),
-                        score=chunk.get("score", 0.0),
-                        page=chunk.get("page"),
-                        slide=chunk.get("slide"),
-                        sheet=chunk.get("sheet"),
-                        start_row=chunk.get("start_row"),
-                        end_row=chunk.get("end_row")
-                    )
-                )
-            
-            return QueryResponse(answer=answer, references=references)
+            response = QueryResponse(answer=answer, references=self._references(top_chunks))
+            if self.answer_cache is not None:
+                self.answer_cache.put(req.question, req.top_k, version, query_emb, response)
+            return response
             
         except HTTPException:
             raise
         except Exception as e:
             raise HTTPException(status_code=500, detail=str(e))
+
+    async def stream_query(self, req: QueryRequest) -> AsyncIterator[str]:
+        """Retrieve chunks and return a Server-Sent Events stream of the answer.
+
+        Retrieval runs before the stream starts so a missing index or empty
+        result still surfaces as an HTTP error. The stream sends a
+        ``references`` event, then one ``token`` event per generated token and
+        finally ``done`` (or ``error`` if generation fails midway).
+        """
+        try:
+            version = self.embedding_service.corpus_version
+            cached, query_emb = await self._cached_answer(req, version)
+            if cached is not None:
+                return self._cached_events(cached)
+            top_chunks = await self.retrieve(req.question, req.top_k, query_emb)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=str(e))
+
+        if not top_chunks:
+            raise HTTPException(status_code=404, detail="No relevant documents found.")
+
+        prompt = await self._build_prompt(top_chunks, req.question)
+        references = self._references(top_chunks)
+
+        def on_complete(answer: str):
+            if self.answer_cache is not None:
+                self.answer_cache.put(
+                    req.question, req.top_k, version, query_emb, QueryResponse(answer=answer, references=references)
+                )
+
+        return self._answer_events(prompt, references, on_complete)
+
+    async def _build_prompt(self, chunks: List[dict], question: str) -> str:
+        """Pack the context on the encode executor; counting tokens may load the tokenizer first."""
+        return await asyncio.get_running_loop().run_in_executor(
+            self.embedding_service.encode_executor, build_prompt, chunks, question
+        )
+
+    async def _cached_answer(self, req: QueryRequest, version: int) -> Tuple[Optional[QueryResponse], Optional[np.ndarray]]:
+        """Look up the answer cache, returning the query embedding computed for the semantic lookup."""
+        if self.answer_cache is None:
+            return None, None
+
+        cached = self.answer_cache.get_exact(req.question, req.top_k, version)
+        if cached is not None:
+            print("⚡ Answer cache hit (exact question)")
+            return cached, None
+
+        query_emb = await self.embedding_service.aembed_query(req.question)
+        cached = self.answer_cache.get_similar(query_emb, req.top_k, version)
+        if cached is not None:
+            print("⚡ Answer cache hit (similar question)")
+        return cached, query_emb
+
+    @staticmethod
+    async def _answer_events(prompt: str, references: List[AnswerChunk],
+                             on_complete: Optional[Callable[[str], None]] = None) -> AsyncIterator[str]:
+        yield _sse("references", [reference.model_dump() for reference in references])
+        tokens = []
+        try:
+            async for token in astream_mistral_local(prompt):
+                tokens.append(token)
+                yield _sse("token", {"text": token})
+        except Exception as e:
+            yield _sse("error", {"detail": str(e)})
+            return
+        if on_complete is not None:
+            on_complete("".join(tokens))
+        yield _sse("done", {})
+
+    @staticmethod
+    async def _cached_events(response: QueryResponse) -> AsyncIterator[str]:
+        yield _sse("references", [reference.model_dump() for reference in response.references])
+        yield _sse("token", {"text": response.answer})
+        yield _sse("done", {})
+
+    @staticmethod
+    def _references(top_chunks: List[dict]) -> List[AnswerChunk]:
+        """Format retrieved chunks as references for the response."""
+        references = []
+        for chunk in top_chunks:
+            references.append(
+                AnswerChunk(
+                    text=chunk.get("text", ""),
+                    source=chunk.get("source", "N/A"),
+                    score=chunk.get("score", 0.0),
+                    page=chunk.get("page"),
+                    slide=chunk.get("slide"),
+                    sheet=chunk.get("sheet"),
+                    start_row=chunk.get("start_row"),
+                    end_row=chunk.get("end_row")
+                )
+            )
+        return references
+
+    async def retrieve(self, question: str, top_k: int, query_emb: Optional[np.ndarray] = None) -> List[dict]:
+        """Retrieve top_k chunks, over-fetching and reranking when a reranker is configured."""
+        if self.rerank_service is None:
+            return await self._search(question, top_k, query_emb)
+
+        candidates = await self._search(question, max(top_k, settings.RERANK_CANDIDATES), query_emb)
+        # Cross-encoder inference shares the query encode threads
+        return await asyncio.get_running_loop().run_in_executor(
+            self.embedding_service.encode_executor, self.rerank_service.rerank, question, candidates, top_k
+        )
+
+    async def _search(self, question: str, top_k: int, query_emb: Optional[np.ndarray] = None) -> List[dict]:
+        """Dense retrieval, fused with BM25 keyword retrieval when hybrid search is enabled."""
+        if self.embedding_service.lexical_index is None:
+            return await self.embedding_service.aquery_vectors(question, top_k=top_k, query_emb=query_emb)
+
+        candidates = max(top_k, settings.HYBRID_CANDIDATES)
+        dense, lexical = await asyncio.gather(
+            self.embedding_service.aquery_vectors(question, top_k=candidates, query_emb=query_emb),
+            self.embedding_service.aquery_lexical(question, top_k=candidates)
+        )
+        return reciprocal_rank_fusion([dense, lexical], k=settings.RRF_K)[:top_k]
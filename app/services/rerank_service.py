@@ -0,0 +1,67 @@
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+from app.core.config import settings
+from app.utils.embedding_cache import EmbeddingCache
+from app.utils.lazy_model import LazyModel
+from app.utils.model_server import model_loader
+
+def load_rerank_model(model_name: Optional[str] = None):
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(model_name or settings.RERANK_MODEL)
+
+class RerankService:
+    """Rescores retrieved chunks with a cross-encoder.
+
+    All uncached (query, chunk) pairs of a request are scored in a single
+    batched ``predict`` call. Scores are kept in an LRU cache keyed by the
+    whitespace-normalized query and the chunk hash, so repeated and
+    overlapping questions only score chunks they have not seen. The model
+    is loaded on the first rerank (or by the startup warm-up).
+    """
+
+    def __init__(self, model_name: str, batch_size: int = 32, cache_size: int = 10000):
+        self.lazy_model = LazyModel("rerank", model_loader("rerank", lambda: load_rerank_model(model_name)))
+        self.batch_size = batch_size
+        self.cache_size = cache_size
+        self.hits = 0
+        self.misses = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        return self.lazy_model.get()
+
+    def rerank(self, query: str, chunks: List[dict], top_k: int) -> List[dict]:
+        """Return the ``top_k`` chunks by cross-encoder score (which replaces ``score``)."""
+        if not chunks:
+            return []
+
+        query_key = " ".join(query.split())
+        keys = [(query_key, EmbeddingCache.key(chunk.get("text", ""))) for chunk in chunks]
+        with self._lock:
+            scores = [self._cache.get(key) for key in keys]
+            for key, score in zip(keys, scores):
+                if score is not None:
+                    self._cache.move_to_end(key)
+            missing = [i for i, score in enumerate(scores) if score is None]
+            self.hits += len(chunks) - len(missing)
+            self.misses += len(missing)
+
+        if missing:
+            pairs = [(query, chunks[i].get("text", "")) for i in missing]
+            predicted = self.model.predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+            with self._lock:
+                for i, score in zip(missing, predicted):
+                    scores[i] = float(score)
+                    self._cache[keys[i]] = scores[i]
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+
+        ranked = sorted(
+            (dict(chunk, score=score) for chunk, score in zip(chunks, scores)),
+            key=lambda chunk: chunk["score"],
+            reverse=True
+        )
+        return ranked[:top_k]
@@ -0,0 +1,129 @@
+import json
+import random
+import threading
+import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
+from typing import Callable, List, Optional, Tuple
+from app.services.vector_store import VectorStore
+
+Vector = Tuple[str, List[float], dict]
+
+FLOAT_JSON_BYTES = 24  # a float32 value serialised as JSON, with separator
+VECTOR_OVERHEAD_BYTES = 64  # field names and punctuation per vector
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+TRANSIENT_NAMES = ("Timeout", "Connection", "Unavailable", "ProtocolError", "MaxRetry")
+
+
+class UpsertError(RuntimeError):
+    """An upsert that failed after retries.
+
+    ``acknowledged`` is the number of leading vectors known to be stored, so
+    the call can be resumed with ``start=acknowledged`` instead of re-sending
+    everything.
+    """
+
+    def __init__(self, message: str, acknowledged: int):
+        super().__init__(message)
+        self.acknowledged = acknowledged
+
+
+def is_transient(error: Exception) -> bool:
+    """Rate limits, server errors and connection problems are worth retrying."""
+    status = getattr(error, "status", None) or getattr(error, "status_code", None)
+    if isinstance(status, int):
+        return status in TRANSIENT_STATUS
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    return any(name in type(error).__name__ for name in TRANSIENT_NAMES)
+
+
+class UpsertEngine:
+    """Concurrent, retrying batch upserts to a ``VectorStore``.
+
+    Vectors are cut into requests of at most ``max_request_bytes`` of
+    estimated JSON payload (chunk text in the metadata included) and
+    ``max_batch_vectors`` vectors. Up to ``workers`` requests run at once. A
+    request failing with a transient error is retried with exponential
+    backoff and jitter; on a permanent error, or once retries run out, pending
+    requests are cancelled and ``UpsertError`` reports the contiguous prefix
+    already acknowledged.
+    """
+
+    def __init__(self, index: VectorStore, max_request_bytes: int = 2 * 1024 * 1024, max_batch_vectors: int = 1000,
+                 workers: int = 4, max_retries: int = 5, backoff_seconds: float = 0.5, max_backoff_seconds: float = 30.0):
+        self.index = index
+        self.max_request_bytes = max_request_bytes
+        self.max_batch_vectors = max_batch_vectors
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix="vector-upsert")
+        self.requests = 0
+        self.retries = 0
+        self._lock = threading.Lock()
+        self._sleep = time.sleep
+
+    @staticmethod
+    def payload_bytes(vector: Vector) -> int:
+        vector_id, values, metadata = vector
+        return len(vector_id) + len(values) * FLOAT_JSON_BYTES + len(json.dumps(metadata or {})) + VECTOR_OVERHEAD_BYTES
+
+    def plan(self, vectors: List[Vector], max_batch_vectors: Optional[int] = None) -> List[Tuple[int, int]]:
+        """Split ``vectors`` into ``(start, end)`` request ranges by payload size and count."""
+        limit = min(max_batch_vectors or self.max_batch_vectors, self.max_batch_vectors)
+        batches, start, size = [], 0, 0
+        for i, vector in enumerate(vectors):
+            vector_bytes = self.payload_bytes(vector)
+            if vector_bytes > self.max_request_bytes:
+                raise ValueError(f"Vector {vector[0]} ({vector_bytes} bytes) exceeds the request size limit")
+            if i > start and (size + vector_bytes > self.max_request_bytes or i - start >= limit):
+                batches.append((start, i))
+                start, size = i, 0
+            size += vector_bytes
+        if start < len(vectors):
+            batches.append((start, len(vectors)))
+        return batches
+
+    def upsert(self, vectors: List[Vector], start: int = 0, max_batch_vectors: Optional[int] = None,
+               on_batch: Optional[Callable[[List[Vector]], None]] = None):
+        """Upsert ``vectors[start:]``, calling ``on_batch`` with each acknowledged request's vectors."""
+        batches = [(start + s, start + e) for s, e in self.plan(vectors[start:], max_batch_vectors)]
+        futures = {self.executor.submit(self._send, vectors[s:e], on_batch): (s, e) for s, e in batches}
+        done, pending = wait(futures, return_when=FIRST_EXCEPTION)
+        failed = [future for future in done if future.exception() is not None]
+        if not failed:
+            return
+
+        for future in pending:
+            future.cancel()
+        wait(pending)
+        acknowledged = {futures[future] for future in futures if future.done() and not future.cancelled()
+                        and future.exception() is None}
+        watermark = start
+        for s, e in batches:
+            if (s, e) not in acknowledged:
+                break
+            watermark = e
+        error = failed[0].exception()
+        raise UpsertError(f"Upsert failed after {watermark} of {len(vectors)} vectors: {error}", watermark) from error
+
+    def _send(self, batch: List[Vector], on_batch: Optional[Callable[[List[Vector]], None]]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                with self._lock:
+                    self.requests += 1
+                self.index.upsert(batch)
+                break
+            except Exception as e:
+                if attempt == self.max_retries or not is_transient(e):
+                    raise
+                delay = min(self.max_backoff_seconds, self.backoff_seconds * 2 ** attempt)
+                print(f"⚠️ Upsert of {len(batch)} vectors failed ({e}), retrying in {delay:.1f}s")
+                with self._lock:
+                    self.retries += 1
+                self._sleep(delay * random.uniform(0.5, 1.0))
+        if on_batch is not None:
+            on_batch(batch)
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
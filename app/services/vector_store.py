@@ -0,0 +1,62 @@
+import os
+from typing import List, Optional, Tuple
+from app.core.config import settings
+
+class VectorStore:
+    """Vector index interface used by EmbeddingService.
+
+    Mirrors the subset of the Pinecone index API the service relies on so
+    backends are interchangeable: ``upsert`` takes ``(id, values, metadata)``
+    tuples and ``query`` returns ``{"matches": [{"id", "score", "metadata"}]}``.
+    """
+
+    def upsert(self, vectors: List[Tuple[str, List[float], dict]]):
+        raise NotImplementedError
+
+    def query(self, vector: List[float], top_k: int = 3, include_metadata: bool = True,
+              filter: Optional[dict] = None) -> dict:
+        raise NotImplementedError
+
+    def delete(self, ids: List[str]):
+        raise NotImplementedError
+
+
+class PineconeVectorStore(VectorStore):
+    """Hosted Pinecone index."""
+
+    def __init__(self, api_key: str, index_name: str):
+        # Imported here so local deployments don't need the Pinecone client installed
+        from pinecone import Pinecone
+        self.pc = Pinecone(api_key=api_key)
+        self.index = self.pc.Index(index_name)
+
+    def upsert(self, vectors):
+        self.index.upsert(vectors=vectors)
+
+    def query(self, vector, top_k=3, include_metadata=True, filter=None):
+        kwargs = {"filter": filter} if filter else {}
+        return self.index.query(vector=vector, top_k=top_k, include_metadata=include_metadata, **kwargs)
+
+    def delete(self, ids):
+        self.index.delete(ids=ids)
+
+
+def load_local_vector_store() -> VectorStore:
+    from app.services.local_vector_store import LocalVectorStore
+    return LocalVectorStore(
+        settings.LOCAL_INDEX_DIR,
+        nprobe=settings.LOCAL_INDEX_NPROBE,
+        ivf_threshold=settings.LOCAL_INDEX_IVF_THRESHOLD,
+        quantization=settings.LOCAL_INDEX_QUANTIZATION,
+        rescore_factor=settings.LOCAL_INDEX_RESCORE_FACTOR
+    )
+
+def create_vector_store() -> VectorStore:
+    """Build the vector store selected by ``settings.VECTOR_STORE``."""
+    if settings.VECTOR_STORE == "pinecone":
+        return PineconeVectorStore(settings.PINECONE_API_KEY or os.getenv("API_KEY"), settings.PINECONE_INDEX_NAME)
+    if settings.VECTOR_STORE == "local":
+        # With several API workers the index is served by one process, which owns its row bookkeeping
+        from app.utils.model_server import model_loader
+        return model_loader("local_index", load_local_vector_store)()
+    raise ValueError(f"Unknown VECTOR_STORE: {settings.VECTOR_STORE}")
@@ -0,0 +1,111 @@
+import math
+from typing import List, Optional
+from app.core.config import settings
+from app.utils.lazy_model import LazyModel
+
+MIN_OVERLAP_CHARS = 20  # shorter end-to-start matches are treated as coincidence
+MIN_TRUNCATED_TOKENS = 32  # don't add a truncated block smaller than this
+CHARS_PER_TOKEN = 3.5  # conservative estimate for English text without a tokenizer
+
+class TokenCounter:
+    """Counts tokens with a Hugging Face fast tokenizer, or estimates them from length."""
+
+    def __init__(self, tokenizer_name: str = ""):
+        self.tokenizer = None
+        if tokenizer_name:
+            try:
+                from tokenizers import Tokenizer
+                self.tokenizer = Tokenizer.from_pretrained(tokenizer_name)
+            except Exception as e:
+                print(f"⚠️ Could not load tokenizer {tokenizer_name}, estimating token counts: {e}")
+
+    def count(self, text: str) -> int:
+        if self.tokenizer is None:
+            return math.ceil(len(text) / CHARS_PER_TOKEN)
+        return len(self.tokenizer.encode(text, add_special_tokens=False).ids)
+
+    def truncate(self, text: str, max_tokens: int) -> str:
+        if self.tokenizer is None:
+            return text[:int(max_tokens * CHARS_PER_TOKEN)]
+        encoding = self.tokenizer.encode(text, add_special_tokens=False)
+        if len(encoding.ids) <= max_tokens:
+            return text
+        return text[:encoding.offsets[max_tokens - 1][1]]
+
+# Without CONTEXT_TOKENIZER the counter only estimates, so there is no model to load
+token_counter = LazyModel(
+    "tokenizer", lambda: TokenCounter(settings.CONTEXT_TOKENIZER), enabled=bool(settings.CONTEXT_TOKENIZER)
+)
+
+def get_token_counter() -> TokenCounter:
+    return token_counter.get()
+
+
+def _join_overlapping(first: str, second: str) -> Optional[str]:
+    """Join ``first`` and ``second`` if the end of ``first`` repeats the start of ``second``."""
+    probe = second[:MIN_OVERLAP_CHARS]
+    if len(probe) < MIN_OVERLAP_CHARS:
+        return None
+    start = max(0, len(first) - len(second))
+    while (pos := first.find(probe, start)) != -1:
+        if second.startswith(first[pos:]):
+            return first[:pos] + second
+        start = pos + 1
+    return None
+
+def _merge(block: dict, chunk: dict) -> bool:
+    """Merge ``chunk`` into ``block`` when they are neighbours from the same page, slide or sheet."""
+    if any(block.get(key) != chunk.get(key) for key in ("source", "page", "slide", "sheet")):
+        return False
+
+    text = chunk.get("text", "")
+    if chunk.get("sheet") is not None:
+        # Spreadsheet row blocks don't overlap; adjacent row ranges are concatenated
+        if block.get("end_row") is not None and chunk.get("start_row") == block["end_row"] + 1:
+            block["text"] = block["text"] + "\n" + text
+            block["end_row"] = chunk.get("end_row")
+            return True
+        if chunk.get("end_row") is not None and block.get("start_row") == chunk["end_row"] + 1:
+            block["text"] = text + "\n" + block["text"]
+            block["start_row"] = chunk.get("start_row")
+            return True
+        return False
+
+    if text in block["text"]:
+        return True
+    if block["text"] in text:
+        block["text"] = text
+        return True
+    merged = _join_overlapping(block["text"], text) or _join_overlapping(text, block["text"])
+    if merged is None:
+        return False
+    block["text"] = merged
+    return True
+
+def pack_context(chunks: List[dict], max_tokens: int, counter: Optional[TokenCounter] = None) -> List[str]:
+    """Deduplicate and merge retrieved chunks, then fit them to ``max_tokens`` by score.
+
+    Chunks from the same page or slide whose text overlaps (the loaders'
+    chunk overlap) are stitched into one passage, and adjacent spreadsheet
+    row blocks are concatenated. Passages are added best score first; the
+    first one that doesn't fit is truncated to the remaining budget.
+    """
+    counter = counter or get_token_counter()
+    blocks = []
+    for chunk in sorted(chunks, key=lambda chunk: chunk.get("score", 0.0), reverse=True):
+        if not chunk.get("text", "").strip():
+            continue
+        if not any(_merge(block, chunk) for block in blocks):
+            blocks.append(dict(chunk))
+
+    passages, used = [], 0
+    for block in blocks:
+        tokens = counter.count(block["text"])
+        if used + tokens > max_tokens:
+            remaining = max_tokens - used
+            if remaining >= MIN_TRUNCATED_TOKENS:
+                passages.append(counter.truncate(block["text"], remaining))
+            break
+        passages.append(block["text"])
+        used += tokens
+    return passages
@@ -0,0 +1,33 @@
+import os
+import sqlite3
+import threading
+
+class CorpusVersion:
+    """Corpus version counter kept in a SQLite file.
+
+    Every upsert and delete bumps it, and answer caches compare it on each
+    lookup. Being a file rather than an attribute, it is shared by all API
+    workers (and survives restarts), so a change ingested by one worker
+    invalidates the caches of the others.
+    """
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS corpus (id INTEGER PRIMARY KEY CHECK (id = 0), version INTEGER NOT NULL)"
+        )
+        self._conn.execute("INSERT OR IGNORE INTO corpus VALUES (0, 0)")
+        self._conn.commit()
+
+    def get(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT version FROM corpus WHERE id = 0").fetchone()[0]
+
+    def bump(self):
+        with self._lock:
+            # A single UPDATE is atomic across processes sharing the file
+            self._conn.execute("UPDATE corpus SET version = version + 1 WHERE id = 0")
+            self._conn.commit()
@@ -1,283 +1,504 @@
-from paddleocr import PaddleOCR
 from PIL import Image
 import fitz  # PyMuPDF
 import io
 import os
+import itertools
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import numpy as np
 import pandas as pd
 import openpyxl
 from pptx.enum.shapes import MSO_SHAPE_TYPE
 from pptx import Presentation
+from app.core.config import settings
+from app.utils.lazy_model import LazyModel
+from app.utils.model_server import model_loader
+from app.utils.ocr_batch import OCRBatcher
+from app.utils.ocr_cache import OCRCache
+from app.utils.ocr_filter import OCRSkipFilter
 
-# Initialize PaddleOCR with updated parameter
-ocr = PaddleOCR(use_textline_orientation=True, lang='en')
+def load_ocr_model():
+    # Importing paddle alone takes seconds, so it happens with the model load
+    from paddleocr import PaddleOCR
+    return PaddleOCR(use_textline_orientation=True, lang='en')
 
-def load_and_chunk_pdf(file_path, chunk_size=1000, overlap=100):
-    print(f"🔍 Processing file: {file_path}")
-    print(f"📁 File exists: {os.path.exists(file_path)}")
-    
-    if not os.path.exists(file_path):
-        print("❌ File not found!")
-        return
-    
+# PaddleOCR is built on the first document that needs it (or by the startup
+# warm-up), not when this module is imported by the API or a loader worker.
+# With model servers running, this resolves to a client of the OCR server.
+ocr_model = LazyModel("ocr", model_loader("ocr", load_ocr_model))
+
+_ocr_cache = None
+_pdf_pool = None
+_pdf_pool_lock = threading.Lock()
+
+def get_ocr_cache():
+    """Process-wide OCR result cache, or None when disabled."""
+    global _ocr_cache
+    if _ocr_cache is None and settings.OCR_CACHE_ENABLED:
+        _ocr_cache = OCRCache(settings.OCR_CACHE_PATH, settings.OCR_CACHE_MAX_MB * 1024 * 1024)
+    return _ocr_cache
+
+
+def _collect(records):
+    """Materialise a chunk generator into the (chunks, metadata) lists of the list-based API."""
     chunks, metadata = [], []
-    
+    for chunk, meta in records:
+        chunks.append(chunk)
+        metadata.append(meta)
+    return chunks, metadata
+
+def _pixmap_to_array(pix):
+    """Convert a PyMuPDF pixmap straight to a 3-channel numpy array (no PNG round-trip)."""
+    if pix.alpha:
+        pix = fitz.Pixmap(pix, 0)  # drop alpha channel
+    img_array = np.frombuffer(pix.samples, dtype=np.uint8).reshape(pix.height, pix.width, pix.n)
+    if pix.n == 1:
+        img_array = np.repeat(img_array, 3, axis=2)
+    return img_array
+
+
+def _extract_pdf_page_range(file_path, start, end, ocr_batch_size, ocr_filter):
+    """Extract pages [start, end) of a PDF as (full_text, image_count) tuples.
+
+    Embedded images from every page in the range are filtered by
+    ``ocr_filter`` and the rest OCR'd in batches.
+    """
+    doc = fitz.open(file_path)
     try:
-        doc = fitz.open(file_path)
-        
-        filename = os.path.basename(file_path)
-        
-        for page_num in range(len(doc)):
-    
+        batcher = OCRBatcher(ocr_model, ocr_batch_size, cache=get_ocr_cache())
+        page_texts, page_image_keys = [], []
+
+        for page_num in range(start, end):
             page = doc[page_num]
             text = page.get_text()
+            page_texts.append(text)
 
+            image_keys = []
             image_list = page.get_images()
-            image_texts = []
-            
+            if ocr_filter.page_is_dense(text, len(image_list)):
+                image_list = []
+
             for img_index, img in enumerate(image_list):
                 try:
-                    print(f"   Processing image {img_index + 1}...")
-                    xref = img[0]
+                    xref, width, height = img[0], img[2], img[3]
+                    key = (page_num, img_index)
+                    if ocr_filter.too_small(width, height):
+                        continue
+
+                    # Repeated logos/templates are resolved from their raw stream hash
+                    raw_stream = doc.xref_stream_raw(xref)
+                    image_hash = OCRCache.hash_bytes(raw_stream) if raw_stream else None
+                    if batcher.lookup(key, image_hash):
+                        image_keys.append(key)
+                        continue
+
                     pix = fitz.Pixmap(doc, xref)
-                    
+
                     # Skip if not RGB or GRAY
                     if pix.n - pix.alpha < 4:
-                        img_data = pix.tobytes("png")
-                        pil_image = Image.open(io.BytesIO(img_data))
-                        img_array = np.array(pil_image)
-                        ocr_result = ocr.ocr(img_array)
-                        extracted_text = []
-                        if ocr_result and len(ocr_result) > 0:
-                            result_data = ocr_result[0]
-                            
-                            if isinstance(result_data, dict):
-                                rec_texts = result_data.get('rec_texts', [])
-                                rec_scores = result_data.get('rec_scores', [])
-                                                
-                                for text_content, confidence in zip(rec_texts, rec_scores):
-                                    if confidence > 0.3 and text_content.strip():
-                                        extracted_text.append(text_content.strip())
-                                        print(f"   ✅ OCR Text: '{text_content}' (confidence: {confidence:.3f})")
-                            
-                            elif isinstance(result_data, list):
-                                # Handle standard list format (fallback)
-                                for line in result_data:
-                                    if line and len(line) >= 2:
-                                        text_content = line[1][0]
-                                        confidence = line[1][1]
-                                        
-                                        if confidence > 0.3 and text_content.strip():
-                                            extracted_text.append(text_content.strip())
-                                            print(f"   ✅ OCR Text: '{text_content}' (confidence: {confidence:.3f})")
-                        
-                        if extracted_text:
-                            combined_text = " ".join(extracted_text)
-                            image_texts.append(f"[IMAGE_TEXT]: {combined_text}")
-                        else:
-                            print(f"   ❌ No text extracted from image {img_index + 1}")
-                    
+                        img_array = _pixmap_to_array(pix)
+                        if not ocr_filter.low_edge_density(img_array):
+                            batcher.add(key, img_array, image_hash)
+                            image_keys.append(key)
+
                     pix = None
-                    
+
                 except Exception as e:
-                    print(f"   ❌ OCR Error on image {img_index + 1}: {e}")
+                    print(f"   ❌ OCR Error on image {img_index + 1} of page {page_num + 1}: {e}")
                     continue
-            
+            page_image_keys.append(image_keys)
+
+        batcher.flush()
+        ocr_filter.record_ocr(batcher)
+        if batcher.cache_hits:
+            print(f"♻️ OCR cache hits for pages {start + 1}-{end}: {batcher.cache_hits}")
+
+        pages = []
+        for page_num, text, image_keys in zip(range(start, end), page_texts, page_image_keys):
+            image_texts = batcher.image_texts(image_keys)
+
             # Combine all text
             full_text = text
             if image_texts:
                 full_text += "\n\n" + "\n".join(image_texts)
-            
-            print(f"📋 Combined text length: {len(full_text.strip())}")
-            
-            # Create chunks
-            page_chunks = 0
-            if full_text.strip():
-                for i in range(0, len(full_text), chunk_size - overlap):
-                    chunk = full_text[i:i+chunk_size]
-                    if chunk.strip():
-                        chunks.append(chunk)
-                        metadata.append({
-                            "page": page_num + 1,
-                            "source": filename,
-                            "text": chunk,
-                            "has_images": len(image_texts) > 0,
-                            "image_count": len(image_texts)
-                        })
-                        page_chunks += 1
-            
-        
+
+            print(f"📋 Page {page_num + 1} combined text length: {len(full_text.strip())}")
+            pages.append((full_text, len(image_texts)))
+        return pages
+    finally:
         doc.close()
-        
-        return chunks, metadata
-        
+
+
+def _extract_pdf_page_range_task(file_path, start, end, ocr_batch_size, ocr_filter):
+    """Process-pool task: extract a page range and return its pages and OCR stats.
+
+    Each worker process imports this module once, so the OCR model is loaded
+    once per worker rather than once per task. ``ocr_filter`` arrives as a
+    fresh pickled copy, so its stats cover just this range.
+    """
+    pages = _extract_pdf_page_range(file_path, start, end, ocr_batch_size, ocr_filter)
+    return pages, ocr_filter.stats
+
+
+def _pdf_page_ranges(total_pages, workers, max_pages_per_range=32):
+    """Split a document into page ranges: a few per worker, capped so results stream."""
+    step = min(-(-total_pages // (workers * 4)), max_pages_per_range)
+    step = max(1, step)
+    return [(start, min(start + step, total_pages)) for start in range(0, total_pages, step)]
+
+
+def get_pdf_pool(workers):
+    """Process pool for PDF page ranges, kept for the life of the process.
+
+    Spawned workers import the app and load PaddleOCR on their first range,
+    so they are reused across documents rather than started per upload.
+    """
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is not None and (_pdf_pool._max_workers != workers or _pdf_pool._broken):
+            _pdf_pool.shutdown(wait=False, cancel_futures=True)
+            _pdf_pool = None
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+        return _pdf_pool
+
+def shutdown_pdf_pool():
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is not None:
+            _pdf_pool.shutdown(wait=False, cancel_futures=True)
+            _pdf_pool = None
+
+
+def _iter_pdf_pages(file_path, total_pages, workers, ocr_batch_size, ocr_filter):
+    """Yield (page_num, full_text, image_count) in page order, range by range."""
+    ranges = _pdf_page_ranges(total_pages, workers)
+
+    if workers <= 1 or total_pages <= 1:
+        for start, end in ranges:
+            for offset, (full_text, image_count) in enumerate(
+                _extract_pdf_page_range(file_path, start, end, ocr_batch_size, ocr_filter)
+            ):
+                yield start + offset, full_text, image_count
+        return
+
+    print(f"⚡ Extracting {total_pages} pages in {len(ranges)} ranges across {workers} workers")
+    pool = get_pdf_pool(workers)
+
+    def submit(page_range):
+        start, end = page_range
+        worker_filter = OCRSkipFilter(ocr_filter.min_area, ocr_filter.min_edge_density, ocr_filter.dense_text_chars)
+        return start, pool.submit(_extract_pdf_page_range_task, file_path, start, end, ocr_batch_size, worker_filter)
+
+    # Keep only a couple of ranges in flight per worker so finished pages don't pile up
+    remaining = iter(ranges)
+    in_flight = deque()
+    try:
+        in_flight.extend(submit(r) for r in itertools.islice(remaining, workers * 2))
+        while in_flight:
+            start, future = in_flight.popleft()
+            range_pages, range_stats = future.result()
+            next_range = next(remaining, None)
+            if next_range is not None:
+                in_flight.append(submit(next_range))
+
+            ocr_filter.merge(range_stats)
+            for offset, (full_text, image_count) in enumerate(range_pages):
+                yield start + offset, full_text, image_count
+    finally:
+        # The pool is shared; only drop this document's queued ranges
+        for _, future in in_flight:
+            future.cancel()
+
+
+def iter_pdf_chunks(file_path, chunk_size=1000, overlap=100, workers=1, ocr_batch_size=8, ocr_filter=None):
+    """Yield (chunk, metadata) pairs for a PDF as pages are extracted."""
+    print(f"🔍 Processing file: {file_path}")
+    
+    if not os.path.exists(file_path):
+        print("❌ File not found!")
+        return
+    
+    doc = fitz.open(file_path)
+    filename = os.path.basename(file_path)
+    total_pages = len(doc)
+    doc.close()
+    
+    ocr_filter = ocr_filter or OCRSkipFilter.from_settings()
+    for page_num, full_text, image_count in _iter_pdf_pages(
+        file_path, total_pages, workers, ocr_batch_size, ocr_filter
+    ):
+        # Create chunks
+        if not full_text.strip():
+            continue
+        for i in range(0, len(full_text), chunk_size - overlap):
+            chunk = full_text[i:i+chunk_size]
+            if chunk.strip():
+                yield chunk, {
+                    "page": page_num + 1,
+                    "source": filename,
+                    "text": chunk,
+                    "has_images": image_count > 0,
+                    "image_count": image_count
+                }
+    
+    print(f"🧮 OCR summary: {ocr_filter.report()}")
+
+
+def load_and_chunk_pdf(file_path, chunk_size=1000, overlap=100, workers=1, ocr_batch_size=8, ocr_filter=None):
+    print(f"📁 File exists: {os.path.exists(file_path)}")
+    
+    if not os.path.exists(file_path):
+        print("❌ File not found!")
+        return
+    
+    try:
+        return _collect(iter_pdf_chunks(file_path, chunk_size, overlap, workers, ocr_batch_size, ocr_filter))
     except Exception as e:
         print(f"❌ Error processing PDF: {e}")
         return [], []
 
 
-def load_and_chunk_excel(file_path, rows_per_chunk=5):
-    filename = os.path.basename(file_path)
-    chunks, metadata = [], []
+def _iter_sheet_rows(file_path):
+    """Yield (sheet_name, row_iterator) for each sheet, opening the workbook once.
 
-    with pd.ExcelFile(file_path) as xls:
-        for sheet_name in xls.sheet_names:
-            df = xls.parse(sheet_name)
+    .xlsx files are streamed with openpyxl in read-only mode; legacy .xls files
+    (not supported by openpyxl) are read in a single pandas call.
+    """
+    if file_path.lower().endswith(".xls"):
+        sheets = pd.read_excel(file_path, sheet_name=None, header=None, dtype=object)
+        for sheet_name, df in sheets.items():
+            yield sheet_name, df.itertuples(index=False, name=None)
+        return
 
-            total_rows = len(df)
-            if total_rows == 0:
-                continue
+    wb = openpyxl.load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        for ws in wb.worksheets:
+            yield ws.title, ws.iter_rows(values_only=True)
+    finally:
+        wb.close()
+
+
+def _column_labels(header_row):
+    """Header cells as column labels, with positional names for blank headers."""
+    labels = []
+    for i, value in enumerate(header_row or ()):
+        label = str(value).strip() if value is not None else ""
+        labels.append(label or f"Column {i + 1}")
+    return labels
+
+
+def _join_nonempty(columns, sep):
+    """Join string Series element-wise, skipping empty strings. Vectorized per column."""
+    result = None
+    for column in columns:
+        if result is None:
+            result = column
+            continue
+        separator = pd.Series(np.where((result != "") & (column != ""), sep, ""), index=result.index)
+        result = result + separator + column
+    return result
+
+
+def _excel_block_chunks(rows, labels, rows_per_chunk):
+    """Build one chunk text per ``rows_per_chunk`` rows of a block, in a single vectorized pass.
+
+    Each non-empty cell is rendered as ``Header: value`` so chunks keep their
+    column context. Returns the chunk texts (possibly empty strings).
+    """
+    frame = pd.DataFrame(rows, dtype=object)
+    while len(labels) < frame.shape[1]:
+        labels.append(f"Column {len(labels) + 1}")
+
+    cells = frame.fillna("").astype(str)
+    labelled = []
+    for i in range(frame.shape[1]):
+        column = cells.iloc[:, i].str.strip()
+        labelled.append(pd.Series(np.where(column != "", labels[i] + ": " + column, ""), index=cells.index))
+    row_texts = _join_nonempty(labelled, "; ")
 
-            # Iterate over the sheet in row-size steps
-            for start in range(0, total_rows, rows_per_chunk):
-                end = min(start + rows_per_chunk, total_rows)
+    # Pad to a whole number of chunks and join the rows of each chunk column-wise
+    n_chunks = -(-len(row_texts) // rows_per_chunk)
+    padded = np.full(n_chunks * rows_per_chunk, "", dtype=object)
+    padded[:len(row_texts)] = row_texts.to_numpy()
+    grid = padded.reshape(n_chunks, rows_per_chunk)
+    return _join_nonempty([pd.Series(grid[:, j]) for j in range(rows_per_chunk)], "\n").tolist()
 
-                chunk_df = df.iloc[start:end]
 
-                # Convert to string, replace NaNs, and concatenate
-                chunk_text = (
-                    chunk_df.fillna("")            # replace NaNs
-                            .astype(str)
-                            .agg(" ".join, axis=1)  # join columns per row
-                            .str.cat(sep=" ")       # join rows into one string
-                            .strip()
-                )
+def iter_excel_chunks(file_path, rows_per_chunk=5, block_rows=10000, sheet_names=None):
+    """Yield (chunk, metadata) pairs for every non-empty block of rows in a workbook.
 
+    Rows are streamed in blocks of ``block_rows`` and each block is chunked in
+    one vectorized pass. The first row of each sheet supplies the column
+    labels. Sheet names are appended to ``sheet_names`` when a list is given,
+    so callers don't need to open the workbook again.
+    """
+    filename = os.path.basename(file_path)
+    # Keep blocks aligned to chunk boundaries so chunks never straddle two blocks
+    block_rows = max(rows_per_chunk, block_rows - block_rows % rows_per_chunk)
+
+    for sheet_name, rows in _iter_sheet_rows(file_path):
+        if sheet_names is not None:
+            sheet_names.append(sheet_name)
+
+        labels = _column_labels(next(rows, None))
+        first_row = 1  # data rows are numbered from 1, after the header
+
+        while True:
+            block = list(itertools.islice(rows, block_rows))
+            if not block:
+                break
+
+            for i, chunk_text in enumerate(_excel_block_chunks(block, labels, rows_per_chunk)):
                 # Skip completely empty chunks
                 if not chunk_text:
                     continue
 
-                chunks.append(chunk_text)
-                metadata.append({
+                start = first_row + i * rows_per_chunk
+                yield chunk_text, {
                     "source": filename,
                     "sheet": sheet_name,
-                    "start_row": start + 1,  # +1 for human-readable numbering
-                    "end_row": end,
+                    "start_row": start,
+                    "end_row": min(start + rows_per_chunk, first_row + len(block)) - 1,
                     "text": chunk_text
-                })
+                }
 
-    return chunks, metadata
+            first_row += len(block)
 
 
+def load_and_chunk_excel(file_path, rows_per_chunk=5):
+    return _collect(iter_excel_chunks(file_path, rows_per_chunk))
+
 
-def load_and_chunk_ppt(file_path: str, chars_per_chunk: int = 1000, overlap: int = 100):
+def _chunk_slides(slides, batcher, filename, chars_per_chunk, overlap):
+    """Yield (chunk, metadata) pairs for slides whose images have been OCR'd."""
+    for slide_idx, slide_text, picture_keys in slides:
+        image_texts = batcher.image_texts(picture_keys)
+        
+        # ── 3️⃣ Combine text sources
+        full_text = slide_text
+        if image_texts:
+            full_text += "\n\n" + "\n".join(image_texts)
+        
+        print(f"     📄 Slide {slide_idx} combined text length: {len(full_text)} characters")
+        
+        if not full_text.strip():
+            print(f"     ⚠️ Slide {slide_idx} is completely empty, skipping...")
+            continue
+        
+        # ── 4️⃣ Create chunks with overlap
+        pos = 0
+        chunk_count = 0
+        while pos < len(full_text):
+            chunk = full_text[pos:pos + chars_per_chunk].strip()
+            if chunk:
+                yield chunk, {
+                    "source": filename,
+                    "slide": slide_idx,
+                    "text": chunk,
+                    "has_images": bool(image_texts),
+                    "image_count": len(image_texts)
+                }
+                chunk_count += 1
+                print(f"        📦 Chunk {chunk_count}: {len(chunk)} chars")
+            pos += chars_per_chunk - overlap
+        
+        print(f"     ✅ Created {chunk_count} chunks from slide {slide_idx}")
+
+
+def iter_ppt_chunks(file_path: str, chars_per_chunk: int = 1000, overlap: int = 100, ocr_batch_size: int = 8,
+                    ocr_filter: OCRSkipFilter = None, slides_per_window: int = 16):
+    """Yield (chunk, metadata) pairs for a PPTX, OCR'ing pictures a window of slides at a time."""
     print(f"🔍 Processing PowerPoint: {file_path}")
     
     if not os.path.exists(file_path):
         print("❌ File not found!")
-        return [], []
+        return
 
     filename = os.path.basename(file_path)
-    chunks, metadata = [], []
-
-    try:
-        prs = Presentation(file_path)
-        for slide_idx, slide in enumerate(prs.slides, start=1):
-            print(f"   Processing slide {slide_idx}...")
-            
-            # ── 1️⃣ Extract text from shapes
-            text_parts = []
-            shape_count = 0
-            for shape in slide.shapes:
-                shape_count += 1
-                if hasattr(shape, "text") and shape.text.strip():
-                    text = shape.text.strip()
-                    text_parts.append(text)
-                    print(f"     📝 Shape {shape_count}: {text[:50]}...")
-            
-            slide_text = "\n".join(text_parts)
-            print(f"     📋 Slide {slide_idx} text length: {len(slide_text)} characters")
-            print(f"     📋 Total shapes on slide: {shape_count}")
-            
-            # ── 2️⃣ OCR every picture on the slide
-            image_texts = []
-            picture_count = 0
-            
-            for shape in slide.shapes:
-                if shape.shape_type == MSO_SHAPE_TYPE.PICTURE:
-                    picture_count += 1
-                    try:
-                        print(f"     🖼️ Processing image {picture_count}...")
-                        
-                        # Extract image data
-                        img_bytes = shape.image.blob
-                        pil_img = Image.open(io.BytesIO(img_bytes))
-                        print(f"        Image size: {pil_img.size}, mode: {pil_img.mode}")
-                        
-                        # Convert to numpy array for OCR
-                        img_array = np.array(pil_img)
-                        print(f"        Array shape: {img_array.shape}")
-                        
-                        # Run OCR
-                        ocr_result = ocr.ocr(img_array)
-                        extracted = []
-                        
-                        if ocr_result and len(ocr_result) > 0:
-                            result_data = ocr_result[0]
-                            
-                            # Handle new dict format (Paddle >= 2.6)
-                            if isinstance(result_data, dict):
-                                rec_texts = result_data.get('rec_texts', [])
-                                rec_scores = result_data.get('rec_scores', [])
-                                
-                                for txt, conf in zip(rec_texts, rec_scores):
-                                    if conf > 0.3 and txt.strip():
-                                        extracted.append(txt.strip())
-                                        print(f"        ✅ OCR Text: '{txt}' (confidence: {conf:.3f})")
-                            
-                            # Handle list format (older versions)
-                            elif isinstance(result_data, list):
-                                for line in result_data:
-                                    if line and len(line) >= 2:
-                                        txt, conf = line[1]
-                                        if conf > 0.3 and txt.strip():
-                                            extracted.append(txt.strip())
-                                            print(f"        ✅ OCR Text: '{txt}' (confidence: {conf:.3f})")
-                        
-                        if extracted:
-                            combined_text = "[IMAGE_TEXT]: " + " ".join(extracted)
-                            image_texts.append(combined_text)
-                            print(f"        📝 Combined OCR: {combined_text[:100]}...")
-                        else:
-                            print(f"        ❌ No text extracted from image {picture_count}")
-                            
-                    except Exception as e:
-                        print(f"        ❌ OCR error on image {picture_count}: {e}")
-                        continue
-            
-            print(f"     🖼️ Found {picture_count} images on slide {slide_idx}")
-            
-            # ── 3️⃣ Combine text sources
-            full_text = slide_text
-            if image_texts:
-                full_text += "\n\n" + "\n".join(image_texts)
-            
-            print(f"     📄 Combined text length: {len(full_text)} characters")
-            
-            if not full_text.strip():
-                print(f"     ⚠️ Slide {slide_idx} is completely empty, skipping...")
+    prs = Presentation(file_path)
+    batcher = OCRBatcher(ocr_model, ocr_batch_size, cache=get_ocr_cache())
+    ocr_filter = ocr_filter or OCRSkipFilter.from_settings()
+    slides = []
+    
+    for slide_idx, slide in enumerate(prs.slides, start=1):
+        print(f"   Processing slide {slide_idx}...")
+        
+        # ── 1️⃣ Extract text from shapes
+        text_parts = []
+        shape_count = 0
+        for shape in slide.shapes:
+            shape_count += 1
+            if hasattr(shape, "text") and shape.text.strip():
+                text = shape.text.strip()
+                text_parts.append(text)
+                print(f"     📝 Shape {shape_count}: {text[:50]}...")
+        
+        slide_text = "\n".join(text_parts)
+        print(f"     📋 Slide {slide_idx} text length: {len(slide_text)} characters")
+        print(f"     📋 Total shapes on slide: {shape_count}")
+        
+        # ── 2️⃣ Queue pictures that may carry text for batched OCR
+        pictures = [shape for shape in slide.shapes if shape.shape_type == MSO_SHAPE_TYPE.PICTURE]
+        picture_keys = []
+        if ocr_filter.page_is_dense(slide_text, len(pictures)):
+            print(f"     ⏭️ Slide {slide_idx} has a dense text layer, skipping OCR of {len(pictures)} images")
+            pictures = []
+        
+        for picture_count, shape in enumerate(pictures, start=1):
+            try:
+                # Extract image data
+                key = (slide_idx, picture_count)
+                img_bytes = shape.image.blob
+                image_hash = OCRCache.hash_bytes(img_bytes)
+                if batcher.lookup(key, image_hash):
+                    picture_keys.append(key)
+                    continue
+                
+                # Image.open only reads the header, so size is checked before decoding
+                pil_img = Image.open(io.BytesIO(img_bytes))
+                print(f"     🖼️ Image {picture_count} size: {pil_img.size}, mode: {pil_img.mode}")
+                if ocr_filter.too_small(*pil_img.size):
+                    continue
+                
+                img_array = np.array(pil_img.convert("RGB"))
+                if ocr_filter.low_edge_density(img_array):
+                    continue
+                
+                batcher.add(key, img_array, image_hash)
+                picture_keys.append(key)
+                    
+            except Exception as e:
+                print(f"        ❌ OCR error on image {picture_count}: {e}")
                 continue
-            
-            # ── 4️⃣ Create chunks with overlap
-            pos = 0
-            chunk_count = 0
-            while pos < len(full_text):
-                chunk = full_text[pos:pos + chars_per_chunk].strip()
-                if chunk:
-                    chunks.append(chunk)
-                    metadata.append({
-                        "source": filename,
-                        "slide": slide_idx,
-                        "text": chunk,
-                        "has_images": bool(image_texts),
-                        "image_count": len(image_texts)
-                    })
-                    chunk_count += 1
-                    print(f"        📦 Chunk {chunk_count}: {len(chunk)} chars")
-                pos += chars_per_chunk - overlap
-            
-            print(f"     ✅ Created {chunk_count} chunks from slide {slide_idx}")
         
+        print(f"     🖼️ Queued {len(picture_keys)} images on slide {slide_idx}")
+        slides.append((slide_idx, slide_text, picture_keys))
+        
+        # Flush OCR and emit chunks a window of slides at a time
+        if len(slides) >= slides_per_window:
+            batcher.flush()
+            yield from _chunk_slides(slides, batcher, filename, chars_per_chunk, overlap)
+            slides = []
+    
+    batcher.flush()
+    yield from _chunk_slides(slides, batcher, filename, chars_per_chunk, overlap)
+    ocr_filter.record_ocr(batcher)
+    print(f"🧮 OCR summary: {ocr_filter.report()}")
+
+
+def load_and_chunk_ppt(file_path: str, chars_per_chunk: int = 1000, overlap: int = 100, ocr_batch_size: int = 8,
+                      ocr_filter: OCRSkipFilter = None):
+    if not os.path.exists(file_path):
+        print(f"❌ File not found: {file_path}")
+        return [], []
+
+    try:
+        chunks, metadata = _collect(
+            iter_ppt_chunks(file_path, chars_per_chunk, overlap, ocr_batch_size, ocr_filter)
+        )
         print(f"🎉 Total chunks created: {len(chunks)}")
         print(f"🎉 Total metadata entries: {len(metadata)}")
         
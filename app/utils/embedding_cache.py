@@ -0,0 +1,139 @@
+import hashlib
+import json
+import os
+import re
+import threading
+from typing import List, Optional, Tuple
+import numpy as np
+
+class EmbeddingCache:
+    """On-disk embedding cache keyed by (model name, normalized chunk hash).
+
+    Each model gets its own pair of files: a memory-mapped ``.vectors`` matrix
+    (float16 or float32) and an append-only ``.index`` file holding one chunk
+    hash per row. A row is written to the matrix before its hash is appended,
+    so a crash can only lose entries, never point a hash at a partial vector.
+    """
+
+    GROW_ROWS = 4096
+
+    def __init__(self, directory: str, model_name: str, dtype: str = "float16"):
+        os.makedirs(directory, exist_ok=True)
+        base = os.path.join(directory, re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name))
+        self.vectors_path = base + ".vectors"
+        self.index_path = base + ".index"
+        self.meta_path = base + ".meta.json"
+        self.dtype = np.dtype(dtype)
+        self.dim: Optional[int] = None
+        self.hits = 0
+        self.misses = 0
+        self._rows = {}
+        self._next_row = 0
+        self._capacity = 0
+        self._matrix = None
+        self._lock = threading.Lock()
+        self._load()
+
+    @staticmethod
+    def key(text: str) -> str:
+        """Hash of the chunk text with whitespace normalized."""
+        normalized = " ".join(text.split())
+        return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+
+    def _load(self):
+        if not os.path.exists(self.meta_path):
+            return
+        with open(self.meta_path) as f:
+            meta = json.load(f)
+        if np.dtype(meta["dtype"]) != self.dtype:
+            # Stored precision changed; start over rather than mixing formats
+            for path in (self.vectors_path, self.index_path, self.meta_path):
+                if os.path.exists(path):
+                    os.remove(path)
+            return
+
+        self.dim = meta["dim"]
+        row_bytes = self.dim * self.dtype.itemsize
+        self._capacity = os.path.getsize(self.vectors_path) // row_bytes if os.path.exists(self.vectors_path) else 0
+        if self._capacity:
+            self._matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r+", shape=(self._capacity, self.dim))
+
+        if os.path.exists(self.index_path):
+            with open(self.index_path) as f:
+                for row, line in enumerate(f):
+                    if row < self._capacity:
+                        self._rows[line.strip()] = row
+                    self._next_row = row + 1
+
+    def _ensure_capacity(self, rows: int):
+        if rows <= self._capacity:
+            return
+        new_capacity = max(rows, self._capacity * 2, self.GROW_ROWS)
+        if self._matrix is not None:
+            self._matrix.flush()
+            self._matrix = None
+        with open(self.vectors_path, "ab") as f:
+            f.truncate(new_capacity * self.dim * self.dtype.itemsize)
+        self._matrix = np.memmap(self.vectors_path, dtype=self.dtype, mode="r+", shape=(new_capacity, self.dim))
+        self._capacity = new_capacity
+
+    def get(self, texts: List[str]) -> Tuple[Optional[np.ndarray], List[int]]:
+        """Look up embeddings for ``texts``.
+
+        Returns ``(vectors, missing)``: a float32 matrix with cached rows filled
+        in (None if nothing has been cached yet) and the indexes of texts that
+        still need encoding.
+        """
+        keys = [self.key(text) for text in texts]
+        with self._lock:
+            rows = [self._rows.get(key) for key in keys]
+            missing = [i for i, row in enumerate(rows) if row is None]
+            self.hits += len(texts) - len(missing)
+            self.misses += len(missing)
+            if self.dim is None:
+                return None, missing
+
+            vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+            found = [i for i, row in enumerate(rows) if row is not None]
+            if found:
+                vectors[found] = self._matrix[[rows[i] for i in found]]
+        return vectors, missing
+
+    def put(self, texts: List[str], embeddings: np.ndarray):
+        """Store embeddings for ``texts``; already-cached texts are skipped."""
+        embeddings = np.asarray(embeddings)
+        with self._lock:
+            if self.dim is None:
+                self.dim = int(embeddings.shape[1])
+                with open(self.meta_path, "w") as f:
+                    json.dump({"dim": self.dim, "dtype": self.dtype.name}, f)
+
+            new_keys, new_rows = [], []
+            for text, vector in zip(texts, embeddings):
+                key = self.key(text)
+                if key in self._rows or key in new_keys:
+                    continue
+                new_keys.append(key)
+                new_rows.append(vector)
+            if not new_keys:
+                return
+
+            start = self._next_row
+            self._ensure_capacity(start + len(new_keys))
+            self._matrix[start:start + len(new_keys)] = np.asarray(new_rows, dtype=self.dtype)
+            self._matrix.flush()
+            with open(self.index_path, "a") as f:
+                f.write("".join(f"{key}\n" for key in new_keys))
+
+            for offset, key in enumerate(new_keys):
+                self._rows[key] = start + offset
+            self._next_row = start + len(new_keys)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._rows),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+        }
@@ -0,0 +1,57 @@
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+_registry: Dict[str, "LazyModel"] = {}
+
+class LazyModel:
+    """A model loaded on first use instead of at import or service construction.
+
+    ``get()`` loads it once under a lock, so a request that arrives while the
+    background warm-up is loading the model waits for that load rather than
+    starting another. A failed load is recorded and retried on the next call.
+    Instances register themselves by name for the readiness endpoint.
+    """
+
+    def __init__(self, name: str, loader: Callable[[], object], enabled: bool = True):
+        self.name = name
+        self.enabled = enabled
+        self._loader = loader
+        self._model = None
+        self._lock = threading.Lock()
+        self.state = "not_loaded"
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        _registry[name] = self
+
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+
+    def get(self):
+        if self._model is not None:
+            return self._model
+        with self._lock:
+            if self._model is None:
+                self.state = "loading"
+                print(f"⏳ Loading {self.name} model...")
+                started = time.perf_counter()
+                try:
+                    model = self._loader()
+                except Exception as e:
+                    self.state, self.error = "failed", str(e)
+                    raise
+                self.load_seconds = round(time.perf_counter() - started, 2)
+                self._model, self.state, self.error = model, "ready", None
+                print(f"✅ Loaded {self.name} model in {self.load_seconds}s")
+        return self._model
+
+    def status(self) -> dict:
+        return {
+            "state": self.state if self.enabled else "disabled",
+            "load_seconds": self.load_seconds,
+            "error": self.error,
+        }
+
+def registered_models() -> Dict[str, LazyModel]:
+    return dict(_registry)
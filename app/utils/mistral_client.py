@@ -1,29 +1,182 @@
+import json
+from typing import AsyncIterator, Optional
+import httpx
 import requests
+from app.core.config import settings
+from app.utils.context_packer import pack_context
 
-def build_prompt(chunks, user_query):
-    """Build prompt from retrieved chunks and user query."""
-    context = "\n\n".join([c["text"] for c in chunks])
+# Fixed instruction sent as Ollama's system prompt. It renders ahead of the
+# per-request context, so the instruction tokens form a prefix whose KV cache
+# Ollama reuses across requests instead of re-evaluating it each time.
+SYSTEM_PROMPT = (
+    "You answer questions about the user's documents. Use only the context "
+    "provided with the question, and say so if the context does not contain the answer."
+)
+
+# Shared connection pools: one keep-alive session for sync callers and one
+# async client whose limits cap concurrent generations sent to Ollama
+_session = requests.Session()
+_async_client: Optional[httpx.AsyncClient] = None
+
+def get_async_client() -> httpx.AsyncClient:
+    """Process-wide async HTTP client for Ollama."""
+    global _async_client
+    if _async_client is None:
+        _async_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.OLLAMA_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.OLLAMA_MAX_CONNECTIONS
+            ),
+            # Requests beyond the connection limit wait for a free connection
+            timeout=httpx.Timeout(420, pool=None)
+        )
+    return _async_client
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.aclose()
+        _async_client = None
+
+class GenerationStats:
+    """Aggregates Ollama's per-request timing fields (reported in nanoseconds)."""
+
+    FIELDS = ("load_duration", "prompt_eval_duration", "eval_duration", "total_duration")
+
+    def __init__(self):
+        self.requests = 0
+        self.cold_loads = 0
+        self.prompt_tokens = 0
+        self.generated_tokens = 0
+        self.totals = dict.fromkeys(self.FIELDS, 0)
+
+    def record(self, data: dict):
+        """Record the final response object of a generation and log its timings."""
+        self.requests += 1
+        self.prompt_tokens += data.get("prompt_eval_count", 0)
+        self.generated_tokens += data.get("eval_count", 0)
+        for field in self.FIELDS:
+            self.totals[field] += data.get(field, 0)
+        load_s = data.get("load_duration", 0) / 1e9
+        # Anything beyond a few hundred ms means the model was (re)loaded into memory
+        if load_s > 0.5:
+            self.cold_loads += 1
+        eval_s = data.get("eval_duration", 0) / 1e9
+        print(
+            f"🤖 Generation: load {load_s:.2f}s, "
+            f"prefill {data.get('prompt_eval_count', 0)} tokens in {data.get('prompt_eval_duration', 0) / 1e9:.2f}s, "
+            f"eval {data.get('eval_count', 0)} tokens in {eval_s:.2f}s"
+            + (f" ({data.get('eval_count', 0) / eval_s:.1f} tok/s)" if eval_s else "")
+        )
+
+    def stats(self) -> dict:
+        seconds = {field: round(total / 1e9, 3) for field, total in self.totals.items()}
+        return {
+            "requests": self.requests,
+            "cold_loads": self.cold_loads,
+            "prompt_tokens": self.prompt_tokens,
+            "generated_tokens": self.generated_tokens,
+            "seconds": seconds,
+            "eval_tokens_per_second": (
+                round(self.generated_tokens / seconds["eval_duration"], 2) if seconds["eval_duration"] else None
+            ),
+        }
+
+generation_stats = GenerationStats()
+
+def build_prompt(chunks, user_query, max_context_tokens=None):
+    """Build the per-request prompt from retrieved chunks and user query.
+
+    The instruction lives in ``SYSTEM_PROMPT``; the packed context comes first
+    here so the variable part of the prompt follows the cached prefix.
+    """
+    passages = pack_context(chunks, max_context_tokens or settings.CONTEXT_MAX_TOKENS)
+    context = "\n\n".join(passages)
     prompt = (
-        "Use the following context to answer the user's question.\n\n"
         f"Context:\n{context}\n\n"
         f"Question: {user_query}\n\n"
         "Answer:"
     )
     return prompt
 
-def query_mistral_local(prompt, model="mistral", base_url="http://ollama:11434", max_tokens=2000):
+def _keep_alive(value: str):
+    """Ollama reads a string as a Go duration ("30m") and a number as seconds, so "-1" is sent as -1."""
+    try:
+        return int(value)
+    except ValueError:
+        return value
+
+def _generate_request(prompt, model, base_url, max_tokens, stream):
+    """URL and JSON body for Ollama's generate endpoint."""
+    options = {
+        "num_predict": max_tokens,
+        "num_ctx": settings.OLLAMA_NUM_CTX,
+        "num_batch": settings.OLLAMA_NUM_BATCH,
+    }
+    if settings.OLLAMA_NUM_THREAD:
+        options["num_thread"] = settings.OLLAMA_NUM_THREAD
+    url = f"{base_url or settings.MISTRAL_BASE_URL or 'http://ollama:11434'}/api/generate"
+    return url, {
+        "model": model or settings.MISTRAL_MODEL,
+        "system": SYSTEM_PROMPT,
+        "prompt": prompt,
+        "stream": stream,
+        "keep_alive": _keep_alive(settings.OLLAMA_KEEP_ALIVE),
+        "options": options,
+    }
+
+def _stream_line(line):
+    """Parse one streamed line, returning its token and whether generation is done."""
+    data = json.loads(line)
+    if data.get("error"):
+        raise RuntimeError(data["error"])
+    if data.get("done"):
+        generation_stats.record(data)
+    return data.get("response"), data.get("done", False)
+
+def query_mistral_local(prompt, model=None, base_url=None, max_tokens=2000):
     """Query local Mistral instance via Ollama API."""
-    response = requests.post(
-        f"{base_url}/api/generate",
-        json={
-            "model": model,
-            "prompt": prompt,
-            "stream": False,
-            "options": {
-                "num_predict": max_tokens
-            }
-        },
-        timeout=420,
-    )
+    url, body = _generate_request(prompt, model, base_url, max_tokens, stream=False)
+    response = _session.post(url, json=body, timeout=420)
     response.raise_for_status()
-    return response.json()["response"]
+    data = response.json()
+    generation_stats.record(data)
+    return data["response"]
+
+def stream_mistral_local(prompt, model=None, base_url=None, max_tokens=2000):
+    """Stream the answer from a local Mistral instance, yielding tokens as Ollama produces them."""
+    url, body = _generate_request(prompt, model, base_url, max_tokens, stream=True)
+    with _session.post(url, json=body, stream=True, timeout=420) as response:
+        response.raise_for_status()
+        # Ollama streams one JSON object per line until "done" is true
+        for line in response.iter_lines():
+            if not line:
+                continue
+            token, done = _stream_line(line)
+            if token:
+                yield token
+            if done:
+                break
+
+async def aquery_mistral_local(prompt, model=None, base_url=None, max_tokens=2000):
+    """Query local Mistral instance via Ollama API without blocking the event loop."""
+    url, body = _generate_request(prompt, model, base_url, max_tokens, stream=False)
+    response = await get_async_client().post(url, json=body)
+    response.raise_for_status()
+    data = response.json()
+    generation_stats.record(data)
+    return data["response"]
+
+async def astream_mistral_local(prompt, model=None, base_url=None, max_tokens=2000) -> AsyncIterator[str]:
+    """Async variant of ``stream_mistral_local``."""
+    url, body = _generate_request(prompt, model, base_url, max_tokens, stream=True)
+    async with get_async_client().stream("POST", url, json=body) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if not line:
+                continue
+            token, done = _stream_line(line)
+            if token:
+                yield token
+            if done:
+                break
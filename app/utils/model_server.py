@@ -0,0 +1,252 @@
+import importlib
+import multiprocessing
+import os
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+from typing import Callable, List
+from app.core.config import settings
+
+# Local loader for each model that can be served, as "module:function"
+MODEL_LOADERS = {
+    "embedding": "app.services.embedding_service:load_embedding_model",
+    "ocr": "app.utils.doc_loader:load_ocr_model",
+    "rerank": "app.services.rerank_service:load_rerank_model",
+    "local_index": "app.services.vector_store:load_local_vector_store",
+    "lexical_index": "app.services.embedding_service:load_lexical_index",
+    "embedding_cache": "app.services.embedding_service:load_embedding_cache",
+}
+# Methods a client may call on each served model
+SERVED_METHODS = {
+    "embedding": {"encode"},
+    "ocr": {"ocr"},
+    "rerank": {"predict"},
+    "local_index": {"upsert", "query", "delete", "stats"},
+    "lexical_index": {"add", "delete", "search"},
+    "embedding_cache": {"get", "put", "stats"},
+}
+SERIALIZED = {"ocr"}  # PaddleOCR is not thread-safe; the others run concurrent requests
+CONNECT_TIMEOUT = 30  # seconds a client retries while a model server is starting
+
+
+def served_stores() -> List[str]:
+    """Enabled stores that keep their row and posting bookkeeping in memory.
+
+    Each worker holding its own copy over the same files would hand out the
+    same rows and miss the others' writes, so whenever model servers run
+    these are served by a single process too.
+    """
+    stores = []
+    if settings.VECTOR_STORE == "local":
+        stores.append("local_index")
+    if settings.HYBRID_SEARCH_ENABLED:
+        stores.append("lexical_index")
+    if settings.EMBEDDING_CACHE_ENABLED:
+        stores.append("embedding_cache")
+    return stores
+
+def served_models() -> List[str]:
+    """Models and stores served out of process; empty when everything loads in each process."""
+    if not settings.MODEL_SERVER_DIR:
+        return []
+    names = [name.strip() for name in settings.MODEL_SERVER_MODELS.split(",") if name.strip()]
+    models = [name for name in names if name in MODEL_LOADERS and (name != "rerank" or settings.RERANK_ENABLED)]
+    return models + [name for name in served_stores() if name not in models]
+
+def model_address(name: str) -> str:
+    if sys.platform == "win32":
+        return rf"\\.\pipe\{os.path.basename(settings.MODEL_SERVER_DIR)}-{name}"
+    return os.path.join(settings.MODEL_SERVER_DIR, f"{name}.sock")
+
+def model_loader(name: str, local_loader: Callable[[], object]) -> Callable[[], object]:
+    """LazyModel loader returning a model-server client when ``name`` is served, else the model itself."""
+    def load():
+        if name in served_models():
+            return RemoteModel.connect(name)
+        return local_loader()
+    return load
+
+def _compact_ocr(results):
+    """Keep only the recognised lines of PaddleOCR results, which otherwise carry the input images."""
+    if not isinstance(results, list):
+        return results
+    return [
+        {"rec_texts": list(result.get("rec_texts", [])), "rec_scores": [float(s) for s in result.get("rec_scores", [])]}
+        if isinstance(result, dict) else result
+        for result in results
+    ]
+
+
+class RemoteModel:
+    """Client for a model served by a ``ModelServer`` process.
+
+    Method calls (``encode``, ``ocr``, ``predict``) are forwarded with their
+    arguments and the result is returned, so it stands in for the model
+    object. Each thread keeps its own connection.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.address = model_address(name)
+        self._local = threading.local()
+
+    @classmethod
+    def connect(cls, name: str) -> "RemoteModel":
+        """Connect and wait until the server has loaded its model."""
+        model = cls(name)
+        model._call("ready")
+        return model
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            deadline = time.monotonic() + CONNECT_TIMEOUT
+            while True:
+                try:
+                    conn = Client(self.address, authkey=settings.MODEL_SERVER_AUTHKEY.encode())
+                    break
+                except (FileNotFoundError, ConnectionRefusedError):
+                    if time.monotonic() > deadline:
+                        raise
+                    time.sleep(0.2)
+            self._local.conn = conn
+        return conn
+
+    def _call(self, method: str, *args, **kwargs):
+        conn = self._connection()
+        try:
+            conn.send((method, args, kwargs))
+            status, result = conn.recv()
+        except (EOFError, OSError):
+            # Reconnect on the next call, e.g. after the server restarted
+            self._local.conn = None
+            raise
+        if status == "error":
+            raise RuntimeError(f"{self.name} model server: {result}")
+        return result
+
+    def __getattr__(self, method: str):
+        if method.startswith("_") or method not in SERVED_METHODS[self.name]:
+            raise AttributeError(method)
+        return lambda *args, **kwargs: self._call(method, *args, **kwargs)
+
+
+class ModelServer:
+    """Loads one model and serves calls to it over a local socket.
+
+    The listener is bound before the model loads, so clients can connect
+    right away; their first call waits for the load to finish. Every
+    connection is handled on its own thread.
+    """
+
+    def __init__(self, name: str, address: str, authkey: bytes):
+        self.name = name
+        self.address = address
+        self.authkey = authkey
+        self.model = None
+        self.error = None
+        self._loaded = threading.Event()
+        self._lock = threading.Lock()
+
+    def _load(self):
+        module, function = MODEL_LOADERS[self.name].split(":")
+        started = time.perf_counter()
+        try:
+            self.model = getattr(importlib.import_module(module), function)()
+            print(f"✅ Model server {self.name} loaded its model in {time.perf_counter() - started:.1f}s")
+        except Exception as e:
+            self.error = f"{type(e).__name__}: {e}"
+            print(f"❌ Model server {self.name} failed to load its model: {self.error}")
+        finally:
+            self._loaded.set()
+
+    def serve_forever(self):
+        if sys.platform != "win32" and os.path.exists(self.address):
+            os.remove(self.address)  # stale socket from a previous run
+        listener = Listener(self.address, authkey=self.authkey)
+        print(f"🛰️ Model server {self.name} listening on {self.address}")
+        threading.Thread(target=self._load, daemon=True).start()
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as e:  # failed handshake; keep serving
+                print(f"⚠️ Model server {self.name} rejected a connection: {e}")
+                continue
+            threading.Thread(target=self._handle, args=(conn,), daemon=True).start()
+
+    def _handle(self, conn):
+        with conn:
+            while True:
+                try:
+                    method, args, kwargs = conn.recv()
+                except (EOFError, OSError):
+                    return
+                self._loaded.wait()
+                response = self._dispatch(method, args, kwargs)
+                try:
+                    conn.send(response)
+                except (BrokenPipeError, OSError):
+                    return
+                except Exception as e:  # the result could not be pickled
+                    conn.send(("error", f"could not return the result: {e}"))
+
+    def _dispatch(self, method, args, kwargs):
+        if self.error is not None:
+            return "error", self.error
+        if method == "ready":
+            return "ok", True
+        if method not in SERVED_METHODS[self.name]:
+            return "error", f"unsupported method {method}"
+        try:
+            if self.name in SERIALIZED:
+                with self._lock:
+                    result = getattr(self.model, method)(*args, **kwargs)
+            else:
+                result = getattr(self.model, method)(*args, **kwargs)
+        except Exception as e:
+            return "error", f"{type(e).__name__}: {e}"
+        return "ok", _compact_ocr(result) if self.name == "ocr" else result
+
+def _serve(name: str, address: str, authkey: bytes):
+    ModelServer(name, address, authkey).serve_forever()
+
+
+def start_model_servers() -> List[multiprocessing.Process]:
+    """Start one model-server process per served model.
+
+    Configures ``MODEL_SERVER_DIR`` and ``MODEL_SERVER_AUTHKEY`` (in the
+    environment too, so API workers spawned afterwards use the servers) and
+    returns once every server is listening.
+    """
+    if not settings.MODEL_SERVER_DIR:
+        settings.MODEL_SERVER_DIR = tempfile.mkdtemp(prefix="rag-models-")
+    if not settings.MODEL_SERVER_AUTHKEY:
+        settings.MODEL_SERVER_AUTHKEY = secrets.token_hex(16)
+    os.environ["MODEL_SERVER_DIR"] = settings.MODEL_SERVER_DIR
+    os.environ["MODEL_SERVER_AUTHKEY"] = settings.MODEL_SERVER_AUTHKEY
+    os.makedirs(settings.MODEL_SERVER_DIR, exist_ok=True)
+
+    context = multiprocessing.get_context("spawn")
+    processes = []
+    for name in served_models():
+        process = context.Process(
+            target=_serve,
+            args=(name, model_address(name), settings.MODEL_SERVER_AUTHKEY.encode()),
+            name=f"model-server-{name}",
+            daemon=True
+        )
+        process.start()
+        processes.append(process)
+
+    for name in served_models():
+        RemoteModel(name)._connection().close()  # connects once the listener is bound
+    return processes
+
+def stop_model_servers(processes: List[multiprocessing.Process]):
+    for process in processes:
+        process.terminate()
+    for process in processes:
+        process.join(timeout=5)
@@ -0,0 +1,143 @@
+import time
+
+MIN_OCR_CONFIDENCE = 0.3
+
+def parse_ocr_result(result_data, min_confidence=MIN_OCR_CONFIDENCE):
+    """Return the confident text lines from one PaddleOCR result."""
+    extracted = []
+    if not result_data:
+        return extracted
+
+    # Handle new dict format (Paddle >= 2.6)
+    if isinstance(result_data, dict):
+        rec_texts = result_data.get('rec_texts', [])
+        rec_scores = result_data.get('rec_scores', [])
+
+        for txt, conf in zip(rec_texts, rec_scores):
+            if conf > min_confidence and txt.strip():
+                extracted.append(txt.strip())
+
+    # Handle list format (older versions)
+    elif isinstance(result_data, list):
+        for line in result_data:
+            if line and len(line) >= 2:
+                txt, conf = line[1][0], line[1][1]
+                if conf > min_confidence and txt.strip():
+                    extracted.append(txt.strip())
+
+    return extracted
+
+
+class OCRBatcher:
+    """Collects images from many pages or slides and runs OCR on them in batches.
+
+    Images are registered under a caller-chosen key (e.g. ``(page, image_index)``)
+    and the recognised lines are looked up by the same key once the batch has
+    been flushed. A batch is flushed automatically when it reaches
+    ``batch_size`` so only that many decoded images are held at a time.
+
+    When an image hash is supplied, ``lookup`` resolves the key from earlier
+    images in the same document or from the persistent ``cache`` so the
+    caller can skip decoding and OCR altogether.
+
+    ``model`` is a ``LazyModel`` for the OCR engine; it is only loaded when a
+    batch with images is flushed, so documents without images never load it.
+    """
+
+    def __init__(self, model, batch_size: int = 8, cache=None):
+        self.model = model
+        self.batch_size = max(1, batch_size)
+        self.cache = cache
+        self.results = {}
+        self.cache_hits = 0
+        self.images_ocr = 0
+        self.ocr_seconds = 0.0
+        self._keys = []
+        self._images = []
+        self._hashes = {}  # key -> image hash for pending images
+        self._seen = {}  # image hash -> key whose result is (or will be) stored
+        self._aliases = {}  # duplicate key -> key of the identical image
+
+    def lookup(self, key, image_hash) -> bool:
+        """Resolve ``key`` without OCR if this image was seen before. Returns True on a hit."""
+        if image_hash is None:
+            return False
+
+        if image_hash in self._seen:
+            primary = self._seen[image_hash]
+            if primary in self.results:
+                self.results[key] = self.results[primary]
+            else:
+                self._aliases[key] = primary
+            self.cache_hits += 1
+            return True
+
+        if self.cache is not None:
+            lines = self.cache.get(image_hash)
+            if lines is not None:
+                self.results[key] = lines
+                self._seen[image_hash] = key
+                self.cache_hits += 1
+                return True
+
+        return False
+
+    def add(self, key, image, image_hash=None):
+        """Queue an RGB/grayscale numpy image for OCR."""
+        self._keys.append(key)
+        self._images.append(image)
+        if image_hash is not None:
+            self._hashes[key] = image_hash
+            self._seen[image_hash] = key
+        if len(self._images) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Run OCR on every queued image and store the text lines per key."""
+        if not self._images:
+            return
+
+        keys, images = self._keys, self._images
+        self._keys, self._images = [], []
+        engine = self.model.get()
+        print(f"   🔠 Running OCR on a batch of {len(images)} images...")
+        started = time.perf_counter()
+
+        try:
+            outputs = engine.ocr(images) if len(images) > 1 else None
+            if outputs is None or len(outputs) != len(images):
+                raise ValueError("engine did not return one result per image")
+        except Exception as e:
+            if len(images) > 1:
+                print(f"   ⚠️ Batched OCR unavailable ({e}), falling back to one image at a time")
+            outputs = []
+            for image in images:
+                try:
+                    result = engine.ocr(image)
+                    outputs.append(result[0] if result else None)
+                except Exception as err:
+                    print(f"   ❌ OCR Error: {err}")
+                    outputs.append(None)
+
+        self.ocr_seconds += time.perf_counter() - started
+        self.images_ocr += len(images)
+
+        for key, output in zip(keys, outputs):
+            self.results[key] = parse_ocr_result(output)
+            image_hash = self._hashes.pop(key, None)
+            if image_hash is not None and self.cache is not None and output is not None:
+                self.cache.put(image_hash, self.results[key])
+
+        for key, primary in list(self._aliases.items()):
+            if primary in self.results:
+                self.results[key] = self.results[primary]
+                del self._aliases[key]
+
+    def image_texts(self, keys):
+        """Return ``[IMAGE_TEXT]: ...`` entries for the given keys that produced text."""
+        image_texts = []
+        for key in keys:
+            lines = self.results.get(key)
+            if lines:
+                image_texts.append(f"[IMAGE_TEXT]: {' '.join(lines)}")
+        return image_texts
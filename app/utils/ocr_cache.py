@@ -0,0 +1,94 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import List, Optional
+
+class OCRCache:
+    """Persistent OCR results keyed by a hash of the image bytes.
+
+    Entries live in a local SQLite file and are evicted least-recently-used
+    first once the stored payload exceeds ``max_bytes``. The file is safe to
+    share between the API process and PDF extraction worker processes.
+    """
+
+    def __init__(self, path: str, max_bytes: int = 256 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache ("
+            " image_hash TEXT PRIMARY KEY,"
+            " lines TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS ocr_cache_last_used ON ocr_cache (last_used)")
+        self._conn.commit()
+        self._total = self._stored_bytes()
+
+    @staticmethod
+    def hash_bytes(data: bytes) -> str:
+        """Content hash used as the cache key."""
+        return hashlib.sha256(data).hexdigest()
+
+    def get(self, image_hash: str) -> Optional[List[str]]:
+        """Return cached OCR lines for an image hash, or None on a miss."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT lines FROM ocr_cache WHERE image_hash = ?", (image_hash,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE ocr_cache SET last_used = ? WHERE image_hash = ?", (time.time(), image_hash)
+            )
+            self._conn.commit()
+        return json.loads(row[0])
+
+    def put(self, image_hash: str, lines: List[str]):
+        """Store OCR lines for an image hash, evicting old entries if over budget."""
+        payload = json.dumps(lines)
+        size = len(payload.encode("utf-8")) + len(image_hash)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (image_hash, lines, size, last_used) VALUES (?, ?, ?, ?)",
+                (image_hash, payload, size, time.time())
+            )
+            self._conn.commit()
+            self._total += size
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def _stored_bytes(self) -> int:
+        row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM ocr_cache").fetchone()
+        return row[0]
+
+    def _evict(self):
+        """Drop least-recently-used entries until the cache is back under 90% of budget."""
+        # Other processes may have written to the file, so re-read the real total
+        self._total = self._stored_bytes()
+        target = int(self.max_bytes * 0.9)
+        if self._total <= target:
+            return
+
+        to_delete = []
+        freed = 0
+        for image_hash, size in self._conn.execute(
+            "SELECT image_hash, size FROM ocr_cache ORDER BY last_used ASC"
+        ):
+            to_delete.append((image_hash,))
+            freed += size
+            if self._total - freed <= target:
+                break
+
+        self._conn.executemany("DELETE FROM ocr_cache WHERE image_hash = ?", to_delete)
+        self._conn.commit()
+        self._total -= freed
+        print(f"🧹 OCR cache evicted {len(to_delete)} entries ({freed} bytes)")
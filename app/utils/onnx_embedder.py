@@ -0,0 +1,175 @@
+import argparse
+import inspect
+import json
+import os
+from typing import List
+import numpy as np
+from app.core.config import settings
+
+PARITY_TEXTS = [
+    "What is the maximum operating pressure of the pump?",
+    "Error code AB-1234 indicates a sensor fault on line 3.",
+    "Quarterly revenue grew 12% driven by services.",
+    "Name: Widget; Qty: 40; Unit price: 3.50",
+    "The slide lists three risks: supply, staffing and regulation.",
+]
+
+def _export_dir(model_name: str) -> str:
+    return os.path.join(settings.EMBEDDING_ONNX_DIR, model_name.replace("/", "__"))
+
+def export_model(model_name: str, quantize: bool = False) -> str:
+    """Export the SentenceTransformer's transformer to ONNX (once) and return the model path.
+
+    The tokenizer and the pooling/normalisation of the SentenceTransformer
+    pipeline are saved alongside, so inference needs neither torch nor
+    sentence_transformers. With ``quantize`` a dynamically int8-quantized
+    copy is written next to the float model.
+    """
+    directory = _export_dir(model_name)
+    path = os.path.join(directory, "model.onnx")
+    if not os.path.exists(path):
+        import torch
+        from sentence_transformers import SentenceTransformer
+        from sentence_transformers.models import Normalize, Pooling
+
+        print(f"📦 Exporting {model_name} to ONNX...")
+        os.makedirs(directory, exist_ok=True)
+        st_model = SentenceTransformer(model_name, device="cpu")
+        pooling = next(module for module in st_model if isinstance(module, Pooling))
+        # sentence-transformers 6 exposes ``pooling_mode``; earlier versions only the string helper
+        mode = getattr(pooling, "pooling_mode", None) or pooling.get_pooling_mode_str()
+        if mode not in ("cls", "mean"):
+            raise ValueError(f"ONNX export supports cls or mean pooling, not {mode}")
+        with open(os.path.join(directory, "pooling.json"), "w") as f:
+            json.dump({
+                "mode": mode,
+                "normalize": any(isinstance(module, Normalize) for module in st_model),
+                "max_length": st_model.max_seq_length,
+                "pad_id": st_model.tokenizer.pad_token_id,
+                "pad_token": st_model.tokenizer.pad_token,
+            }, f)
+        st_model.tokenizer.save_pretrained(directory)
+
+        dummy = st_model.tokenizer(["an example sentence"], return_tensors="pt")
+        names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy]
+        transformer = st_model[0].auto_model.eval()
+
+        class HiddenStates(torch.nn.Module):
+            # Passes the inputs by name; positional order of forward() differs across transformers versions
+            def __init__(self):
+                super().__init__()
+                self.transformer = transformer
+
+            def forward(self, *inputs):
+                return self.transformer(**dict(zip(names, inputs)))[0]
+        export_args = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            export_args["dynamo"] = False  # the TorchScript exporter handles dynamic axes for HF models
+        # Written under a temporary name so concurrent processes never load a partial file
+        with torch.no_grad():
+            torch.onnx.export(
+                HiddenStates(),
+                tuple(dummy[name] for name in names),
+                path + ".tmp",
+                input_names=names,
+                output_names=["last_hidden_state"],
+                dynamic_axes={name: {0: "batch", 1: "sequence"} for name in names + ["last_hidden_state"]},
+                opset_version=14,
+                **export_args
+            )
+        os.replace(path + ".tmp", path)
+
+    if not quantize:
+        return path
+    quantized_path = os.path.join(directory, "model.int8.onnx")
+    if not os.path.exists(quantized_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        print(f"📦 Quantizing {model_name} ONNX weights to int8...")
+        quantize_dynamic(path, quantized_path + ".tmp", weight_type=QuantType.QInt8)
+        os.replace(quantized_path + ".tmp", quantized_path)
+    return quantized_path
+
+
+class OnnxEmbedder:
+    """SentenceTransformer-compatible ``encode`` running an exported model on ONNX Runtime."""
+
+    def __init__(self, model_name: str, quantize: bool = False, threads: int = 0, batch_size: int = 32):
+        import onnxruntime as ort
+        from tokenizers import Tokenizer
+
+        path = export_model(model_name, quantize)
+        directory = os.path.dirname(path)
+        with open(os.path.join(directory, "pooling.json")) as f:
+            self.pooling = json.load(f)
+        self.batch_size = batch_size
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, "tokenizer.json"))
+        self.tokenizer.enable_truncation(self.pooling["max_length"])
+        self.tokenizer.enable_padding(pad_id=self.pooling["pad_id"], pad_token=self.pooling["pad_token"])
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads  # 0 lets ONNX Runtime use every physical core
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [model_input.name for model_input in self.session.get_inputs()]
+
+    def encode(self, sentences, batch_size: int = None, show_progress_bar: bool = False, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, str)
+        texts: List[str] = [sentences] if single else list(sentences)
+        batch_size = batch_size or self.batch_size
+        batches = [self._encode_batch(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)]
+        embeddings = np.concatenate(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+        return embeddings[0] if single else embeddings
+
+    def token_lengths(self, texts: List[str]) -> List[int]:
+        return [sum(encoding.attention_mask) for encoding in self.tokenizer.encode_batch(texts)]
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        feeds = {
+            "input_ids": np.array([e.ids for e in encodings], dtype=np.int64),
+            "attention_mask": np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            "token_type_ids": np.array([e.type_ids for e in encodings], dtype=np.int64),
+        }
+        hidden = self.session.run(None, {name: feeds[name] for name in self.input_names})[0]
+        if self.pooling["mode"] == "cls":
+            embeddings = hidden[:, 0]
+        else:
+            mask = feeds["attention_mask"][..., None].astype(np.float32)
+            embeddings = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+        if self.pooling["normalize"]:
+            embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+        return embeddings.astype(np.float32)
+
+
+def check_parity(model_name: str, quantize: bool = False, texts: List[str] = PARITY_TEXTS) -> dict:
+    """Compare ONNX Runtime embeddings with the PyTorch SentenceTransformer on ``texts``."""
+    from sentence_transformers import SentenceTransformer
+
+    reference = np.asarray(SentenceTransformer(model_name, device="cpu").encode(texts), dtype=np.float32)
+    candidate = OnnxEmbedder(model_name, quantize=quantize).encode(texts)
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosines = (reference * candidate).sum(axis=1)
+    # Neighbour order must survive: compare the pairwise similarity matrices too
+    similarity_error = np.abs(reference @ reference.T - candidate @ candidate.T).max()
+    return {
+        "min_cosine": float(cosines.min()),
+        "mean_cosine": float(cosines.mean()),
+        "max_similarity_error": float(similarity_error),
+    }
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export an embedding model to ONNX and check parity with PyTorch.")
+    parser.add_argument("--model", default=settings.EMBEDDING_MODEL)
+    parser.add_argument("--quantize", action="store_true", help="check the dynamically int8-quantized model")
+    parser.add_argument("--min-cosine", type=float, default=None, help="exit non-zero below this cosine")
+    args = parser.parse_args()
+
+    min_cosine = args.min_cosine if args.min_cosine is not None else (0.99 if args.quantize else 0.9999)
+    result = check_parity(args.model, args.quantize)
+    print(json.dumps(result, indent=2))
+    if result["min_cosine"] < min_cosine:
+        raise SystemExit(f"❌ ONNX embeddings diverge from PyTorch (min cosine {result['min_cosine']:.5f} < {min_cosine})")
+    print("✅ ONNX embeddings match PyTorch")
@@ -0,0 +1,49 @@
+import numpy as np
+
+# Compact vector codes used to shortlist candidates before rescoring them with
+# full-precision vectors. "int8" stores one byte per dimension plus a float32
+# scale per vector (about 4x smaller than float32); "binary" keeps only the
+# sign of each dimension packed into bits (32x smaller) and ranks by Hamming
+# distance.
+METHODS = ("none", "int8", "binary")
+BLOCK_ROWS = 2048  # rows decoded at a time; small blocks stay in CPU cache during a scan
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+def _hamming(codes: np.ndarray, query_bits: np.ndarray) -> np.ndarray:
+    differing = np.bitwise_xor(codes, query_bits)
+    if not hasattr(np, "bitwise_count"):  # numpy < 2.0
+        return _POPCOUNT[differing].sum(axis=1, dtype=np.int32)
+    if differing.shape[1] % 8 == 0:
+        differing = differing.view(np.uint64)
+    return np.bitwise_count(differing).sum(axis=1, dtype=np.int32)
+
+def code_width(method: str, dim: int) -> int:
+    """Bytes per vector for ``method``."""
+    return dim if method == "int8" else (dim + 7) // 8
+
+def quantize_int8(vectors: np.ndarray):
+    """Symmetric per-vector scalar quantization, returning ``(codes, scales)``."""
+    scales = np.maximum(np.abs(vectors).max(axis=1) / 127, 1e-12).astype(np.float32)
+    codes = np.rint(vectors / scales[:, None]).astype(np.int8)
+    return codes, scales
+
+def binarize(vectors: np.ndarray) -> np.ndarray:
+    """One bit per dimension (set when positive), packed into uint8."""
+    return np.packbits(vectors > 0, axis=1)
+
+def approximate_scores(method: str, codes: np.ndarray, scales, rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Approximate similarity of ``query`` to each of ``rows``; higher is more similar.
+
+    int8 scores are dot products with the dequantized vectors; binary scores
+    are negated Hamming distances, which only preserve the ranking.
+    """
+    scores = np.empty(len(rows), dtype=np.float32)
+    query_bits = binarize(query[None])[0] if method == "binary" else None
+    for start in range(0, len(rows), BLOCK_ROWS):
+        block = rows[start:start + BLOCK_ROWS]
+        if method == "int8":
+            scores[start:start + len(block)] = (codes[block].astype(np.float32) @ query) * scales[block]
+        else:
+            scores[start:start + len(block)] = -_hamming(codes[block], query_bits)
+    return scores
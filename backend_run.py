@@ -3,7 +3,11 @@
 Start the FastAPI backend server.
 """
 import multiprocessing
+import os
+import time
 import uvicorn
+from app.core.config import settings
+from app.utils.model_server import start_model_servers, stop_model_servers
 
 # Set multiprocessing start method for compatibility
 multiprocessing.set_start_method("spawn", force=True)
@@ -14,11 +18,24 @@ if __name__ == "__main__":
     print("🔍 Health Check: http://127.0.0.1:8000/health")
     print("📋 API Base URL: http://127.0.0.1:8000/api/v1")
     print("=" * 50)
-    
-    uvicorn.run(
-        "app.main:app",
-        host="127.0.0.1",
-        port=8000
-    )
+
+    # Workers of this launch share its start time, so job recovery leaves each other's jobs alone
+    os.environ["INGESTION_LAUNCHED_AT"] = str(time.time())
+
+    # Several workers share one process per model instead of each loading its own copy
+    model_servers = []
+    if settings.API_WORKERS > 1:
+        model_servers = start_model_servers()
+        print(f"🛰️ Started {len(model_servers)} model servers for {settings.API_WORKERS} API workers")
+
+    try:
+        uvicorn.run(
+            "app.main:app",
+            host="127.0.0.1",
+            port=8000,
+            workers=settings.API_WORKERS
+        )
+    finally:
+        stop_model_servers(model_servers)
     
     
@@ -22,7 +22,10 @@ def upload_file_gr(file):
             return "Error: Unsupported file object type"
         
         if response.status_code == 200:
-            return response.json()["message"]
+            result = response.json()
+            if result.get("job_id"):
+                return f"{result['message']}\nJob ID: {result['job_id']}"
+            return result["message"]
         else:
             error_detail = response.json().get("detail", response.text)
             return f"Error: {error_detail}"
@@ -91,10 +94,57 @@ def delete_file_gr(filename):
     except Exception as e:
         return f"❌ Error: {str(e)}", get_files_list(), get_files_dropdown()
 
+def format_references(references):
+    """Format reference chunks returned by the query endpoints as markdown."""
+    if not references:
+        return ""
+
+    formatted = "**📚 References:**\n"
+    for i, ref in enumerate(references, 1):
+        source = ref.get("source", "Unknown")
+        score = ref.get("score", 0.0)
+
+        # Build location string from metadata
+        loc_parts = []
+        if ref.get("page") is not None:
+            loc_parts.append(f"Page {ref['page']}")
+        if ref.get("slide") is not None:
+            loc_parts.append(f"Slide {ref['slide']}")
+        if ref.get("sheet"):
+            if ref.get("start_row") and ref.get("end_row"):
+                loc_parts.append(
+                    f"Sheet {ref['sheet']} (Rows {ref['start_row']}-{ref['end_row']})"
+                )
+            else:
+                loc_parts.append(f"Sheet {ref['sheet']}")
+
+        location = " | ".join(loc_parts) if loc_parts else "Location N/A"
+        preview = ref.get("text", "")[:150] + "…"
+
+        formatted += (
+            f"\n**{i}.** 📄 {source} — {location} — "
+            f"Score: {score:.3f}\n"
+            f"*Preview:* {preview}\n"
+        )
+    return formatted
+
+def iter_sse(response):
+    """Yield (event, data) pairs from a Server-Sent Events response."""
+    event, data_lines = "message", []
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[len("event:"):].strip()
+        elif line.startswith("data:"):
+            data_lines.append(line[len("data:"):].strip())
+        elif not line and data_lines:
+            yield event, json.loads("\n".join(data_lines))
+            event, data_lines = "message", []
+
 def chat_with_documents(message, history, top_k):
-    """Chat with your documents using the query endpoint."""
+    """Chat with your documents, rendering the answer as tokens stream in."""
     if not message.strip():
-        return history, ""
+        yield history, ""
+        return
 
     try:
         # Prepare request payload
@@ -103,57 +153,31 @@ def chat_with_documents(message, history, top_k):
             "top_k": int(top_k)
         }
 
-        # Send request to query endpoint
-        response = requests.post(f"{API_URL}/api/v1/query/", json=payload)
-
-        if response.status_code == 200:
-            result = response.json()
-            answer = result.get("answer", "No answer received")
-            references = result.get("references", [])
+        # References arrive first, then answer tokens as Mistral generates them
+        with requests.post(f"{API_URL}/api/v1/query/stream", json=payload, stream=True) as response:
+            if response.status_code == 200:
+                answer, references = "", ""
+                history.append([message, "**Answer:**\n…"])
+                for event, data in iter_sse(response):
+                    if event == "references":
+                        references = format_references(data)
+                    elif event == "token":
+                        answer += data["text"]
+                    elif event == "error":
+                        answer += f"\n\n❌ Error: {data['detail']}"
+                    else:
+                        continue
+                    history[-1][1] = f"**Answer:**\n{answer or '…'}\n\n{references}"
+                    yield history, ""
 
-            # Format response with references
-            formatted_response = f"**Answer:**\n{answer}\n\n"
+            elif response.status_code == 404:
+                error_msg = "❌ No relevant documents found for your question. Please upload some documents first."
+                history.append([message, error_msg])
 
-            if references:
-                formatted_response += "**📚 References:**\n"
-                for i, ref in enumerate(references, 1):
-                    source = ref.get("source", "Unknown")
-                    score = ref.get("score", 0.0)
-
-                    # Build location string from metadata
-                    loc_parts = []
-                    if ref.get("page") is not None:
-                        loc_parts.append(f"Page {ref['page']}")
-                    if ref.get("slide") is not None:
-                        loc_parts.append(f"Slide {ref['slide']}")
-                    if ref.get("sheet"):
-                        if ref.get("start_row") and ref.get("end_row"):
-                            loc_parts.append(
-                                f"Sheet {ref['sheet']} (Rows {ref['start_row']}-{ref['end_row']})"
-                            )
-                        else:
-                            loc_parts.append(f"Sheet {ref['sheet']}")
-
-                    location = " | ".join(loc_parts) if loc_parts else "Location N/A"
-                    preview = ref.get("text", "")[:150] + "…"
-
-                    formatted_response += (
-                        f"\n**{i}.** 📄 {source} — {location} — "
-                        f"Score: {score:.3f}\n"
-                        f"*Preview:* {preview}\n"
-                    )
-
-            # Add to chat history
-            history.append([message, formatted_response])
-
-        elif response.status_code == 404:
-            error_msg = "❌ No relevant documents found for your question. Please upload some documents first."
-            history.append([message, error_msg])
-
-        else:
-            error_detail = response.json().get("detail", response.text)
-            error_msg = f"❌ Error: {error_detail}"
-            history.append([message, error_msg])
+            else:
+                error_detail = response.json().get("detail", response.text)
+                error_msg = f"❌ Error: {error_detail}"
+                history.append([message, error_msg])
 
     except requests.exceptions.ConnectionError:
         error_msg = "❌ Error: Cannot connect to API server. Please make sure it's running on port 8000."
@@ -162,7 +186,7 @@ def chat_with_documents(message, history, top_k):
         error_msg = f"❌ Error: {str(e)}"
         history.append([message, error_msg])
 
-    return history, ""
+    yield history, ""
 
 def refresh_all():
     """Refresh files display and dropdown."""